@@ -1,60 +1,131 @@
-import os
-from typing import Dict, Any
+import asyncio
+import uuid
+from datetime import datetime
+from functools import lru_cache
+
 from fastapi import APIRouter, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
-from ..models.analysis import AnalysisRequest, AnalysisResponse
+from ..models.analysis import AnalysisRequest, AnalysisResponse, AnalysisStatus
 from ..core.analysis_engine import AnalysisEngine
+from ..services.report_service import ReportService
+from config.settings import get_settings
 
 router = APIRouter()
 
-# In-memory storage for reports (in production, use a database)
-reports_storage: Dict[str, AnalysisResponse] = {}
 
-# Initialize analysis engine
-analysis_engine = AnalysisEngine(
-    max_dependencies=int(os.getenv("MAX_DEPENDENCIES", "1000")),
-    osv_api_url=os.getenv("OSV_API_BASE_URL", "https://api.osv.dev"),
-    openai_api_key=os.getenv("OPENAI_API_KEY")
-)
+@lru_cache(maxsize=1)
+def get_reports_storage() -> ReportService:
+    """
+    Persistent storage for reports, kept out of process memory
+
+    Opened on first use, so importing the routes creates no database. Its calls
+    block on SQLite, so handlers make them with asyncio.to_thread.
+    """
+    return ReportService(db_path=get_settings().REPORTS_DB_PATH)
 
 
-@router.post("/analyze", response_model=AnalysisResponse)
-async def analyze_repository(request: AnalysisRequest):
+@lru_cache(maxsize=1)
+def get_analysis_engine() -> AnalysisEngine:
     """
-    Analyze a GitHub repository for vulnerabilities
+    The analysis engine shared by all requests, built from the application settings
 
-    This endpoint performs a complete vulnerability analysis:
+    Built on first use, so importing the routes does not require a valid
+    configuration; the app validates it on startup before building the engine.
+    """
+    settings = get_settings()
+    return AnalysisEngine(
+        max_dependencies=settings.MAX_DEPENDENCIES,
+        osv_api_url=settings.OSV_API_BASE_URL,
+        openai_api_key=settings.OPENAI_API_KEY,
+        openai_model=settings.OPENAI_MODEL,
+        openai_temperature=settings.OPENAI_TEMPERATURE,
+        openai_max_tokens=settings.OPENAI_MAX_TOKENS,
+        triage_concurrency=settings.TRIAGE_CONCURRENCY,
+        triage_batch_size=settings.TRIAGE_BATCH_SIZE,
+        cache_path=settings.CACHE_PATH,
+        osv_cache_ttl=settings.OSV_CACHE_TTL,
+        osv_batch_size=settings.OSV_BATCH,
+        triage_cache_ttl=settings.TRIAGE_CACHE_TTL,
+        triage_max_retries=settings.TRIAGE_MAX_RETRIES,
+        clone_timeout=settings.REPO_CLONE_TIMEOUT,
+        clone_dir=settings.REPO_CLONE_DIR,
+        mirror_dir=settings.REPO_MIRROR_DIR
+    )
+
+
+async def _run_and_store(request: AnalysisRequest, report_id: str):
+    """Run an analysis in the background and store its finished report"""
+    try:
+        response = await get_analysis_engine().analyze_repository(request, report_id=report_id)
+    except Exception as e:
+        response = AnalysisResponse(
+            report_id=report_id,
+            repo_url=str(request.repo_url),
+            status=AnalysisStatus.FAILED,
+            analysis_timestamp=datetime.now(),
+            dependencies_analyzed=0,
+            vulnerabilities_found=0,
+            real_threats=0,
+            analysis_duration=0.0,
+            errors=[f"Analysis failed: {str(e)}"]
+        )
+
+    await asyncio.to_thread(get_reports_storage().save, response)
+
+
+@router.post(
+    "/analyze",
+    response_model=AnalysisResponse,
+    response_class=ORJSONResponse,
+    status_code=202
+)
+async def analyze_repository(request: AnalysisRequest, background_tasks: BackgroundTasks):
+    """
+    Start a vulnerability analysis of a GitHub repository
+
+    The analysis runs in the background:
     1. Clones the repository
     2. Extracts dependencies
     3. Queries vulnerability databases
     4. Performs LLM-based triage
-    5. Returns a comprehensive report
+    5. Stores a comprehensive report
+
+    A pending report is returned immediately; poll GET /reports/{report_id}
+    until its status is "done" or "failed".
     """
     try:
-        # Perform the analysis
-        response = await analysis_engine.analyze_repository(request)
+        get_analysis_engine().repository_service.validate_repo_url(str(request.repo_url))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Store the report
-        reports_storage[response.report_id] = response
+    response = AnalysisResponse(
+        report_id=str(uuid.uuid4()),
+        repo_url=str(request.repo_url),
+        status=AnalysisStatus.PENDING,
+        analysis_timestamp=datetime.now(),
+        dependencies_analyzed=0,
+        vulnerabilities_found=0,
+        real_threats=0,
+        analysis_duration=0.0
+    )
+    await asyncio.to_thread(get_reports_storage().save, response)
 
-        return response
+    background_tasks.add_task(_run_and_store, request, response.report_id)
 
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+    return response
 
 
-@router.get("/reports/{report_id}", response_model=AnalysisResponse)
+@router.get("/reports/{report_id}", response_model=AnalysisResponse, response_class=ORJSONResponse)
 async def get_report(report_id: str):
     """
     Retrieve a specific analysis report by ID
     """
-    if report_id not in reports_storage:
+    report = await asyncio.to_thread(get_reports_storage().get, report_id)
+    if report is None:
         raise HTTPException(status_code=404, detail="Report not found")
 
-    return reports_storage[report_id]
+    return report
 
 
 @router.get("/health")
@@ -74,18 +145,7 @@ async def list_reports():
     """
     List all available reports
     """
-    return {
-        "reports": [
-            {
-                "report_id": report_id,
-                "repo_url": report.repo_url,
-                "analysis_timestamp": report.analysis_timestamp,
-                "vulnerabilities_found": report.vulnerabilities_found,
-                "real_threats": report.real_threats
-            }
-            for report_id, report in reports_storage.items()
-        ]
-    }
+    return {"reports": await asyncio.to_thread(get_reports_storage().list_summaries)}
 
 
 @router.delete("/reports/{report_id}")
@@ -93,8 +153,7 @@ async def delete_report(report_id: str):
     """
     Delete a specific report
     """
-    if report_id not in reports_storage:
+    if not await asyncio.to_thread(get_reports_storage().delete, report_id):
         raise HTTPException(status_code=404, detail="Report not found")
 
-    del reports_storage[report_id]
     return {"message": "Report deleted successfully"}
@@ -1,16 +1,24 @@
+import asyncio
+import aiohttp
+import os
 import time
 import uuid
-from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from collections import Counter
+from typing import List, Dict, Any, Optional, Set, Tuple
 from datetime import datetime
 
-from ..models.analysis import AnalysisRequest, AnalysisResponse, TriageResult
-from ..models.dependency import Dependency
+from ..models.analysis import AnalysisRequest, AnalysisResponse, AnalysisStatus, TriageResult
+from ..models.dependency import Dependency, DependencyType
 from ..models.vulnerability import Vulnerability, VulnerabilityReport, ThreatLevel
 from ..services.repository_service import RepositoryService
-from ..services.dependency_service import DependencyService
+from ..services.dependency_service import DependencyService, SKIP_DIRS
 from ..services.vulnerability_service import VulnerabilityService
-from ..services.triage_service import TriageService
+from ..services.triage_service import TriageService, fallback_triage
+from ..services.cache_service import CacheService
+from .protocols import DependencyServiceProto, RepositoryServiceProto, TriageServiceProto
+
+# Most common file suffixes named in the triage context
+MAX_CONTEXT_EXTENSIONS = 64
 
 
 class AnalysisEngine:
@@ -20,39 +28,83 @@ class AnalysisEngine:
         self,
         max_dependencies: int = 1000,
         osv_api_url: str = "https://api.osv.dev",
-        openai_api_key: str = None
+        openai_api_key: str = None,
+        openai_model: str = "gpt-4o-mini",
+        openai_temperature: float = 0.1,
+        openai_max_tokens: int = 1000,
+        triage_concurrency: int = 8,
+        triage_batch_size: int = 5,
+        cache_path: Optional[str] = None,
+        osv_cache_ttl: int = 86400,
+        osv_batch_size: int = 128,
+        triage_cache_ttl: int = 7 * 86400,
+        triage_max_retries: int = 5,
+        clone_timeout: int = 300,
+        clone_dir: Optional[str] = None,
+        mirror_dir: Optional[str] = None,
+        repository_service: Optional[RepositoryServiceProto] = None,
+        dependency_service: Optional[DependencyServiceProto] = None,
+        triage_service: Optional[TriageServiceProto] = None
     ):
         self.max_dependencies = max_dependencies
         self.osv_api_url = osv_api_url
         self.openai_api_key = openai_api_key
-
-        # Initialize services
-        self.repository_service = RepositoryService()
-        self.dependency_service = DependencyService(max_dependencies=max_dependencies)
-        self.triage_service = TriageService(openai_api_key=openai_api_key)
-
-    async def analyze_repository(self, request: AnalysisRequest) -> AnalysisResponse:
+        self.triage_concurrency = triage_concurrency
+        self.triage_batch_size = triage_batch_size
+        self.osv_cache_ttl = osv_cache_ttl
+        self.osv_batch_size = osv_batch_size
+
+        # Initialize services (the real ones, unless others are given)
+        self.repository_service = repository_service or RepositoryService(
+            clone_timeout=clone_timeout,
+            clone_dir=clone_dir,
+            mirror_dir=mirror_dir
+        )
+        self.dependency_service = dependency_service or DependencyService(max_dependencies=max_dependencies)
+        self.cache_service = CacheService(cache_path) if cache_path else None
+        self.triage_service = triage_service or TriageService(
+            openai_api_key=openai_api_key,
+            model=openai_model,
+            temperature=openai_temperature,
+            max_tokens=openai_max_tokens,
+            cache=self.cache_service,
+            cache_ttl=triage_cache_ttl,
+            max_retries=triage_max_retries
+        )
+
+        # Optional shared HTTP session for OSV requests, reused across analyses
+        self.osv_session: Optional[aiohttp.ClientSession] = None
+
+    async def analyze_repository(
+        self,
+        request: AnalysisRequest,
+        report_id: Optional[str] = None
+    ) -> AnalysisResponse:
         """
         Perform complete vulnerability analysis of a GitHub repository
 
         Args:
             request: Analysis request with repository URL and parameters
+            report_id: ID to give the report (generated if not provided)
 
         Returns:
             AnalysisResponse with complete vulnerability report
         """
-        start_time = time.time()
-        report_id = str(uuid.uuid4())
+        start_time = time.perf_counter()
+        report_id = report_id or str(uuid.uuid4())
+        repo_path = None
         errors = []
 
         try:
             # Step 1: Clone repository
             repo_path = await self.repository_service.clone_repository(str(request.repo_url))
 
-            # Step 2: Extract dependencies
-            dependencies = await self.dependency_service.extract_dependencies(repo_path)
+            # Step 2: Extract dependencies and check which ones are actually used,
+            # with one walk of the repository
+            dependencies, dependency_usage = await self.dependency_service.analyze(repo_path)
 
             if not dependencies:
+                await asyncio.to_thread(self.repository_service.cleanup, repo_path)
                 return AnalysisResponse(
                     report_id=report_id,
                     repo_url=str(request.repo_url),
@@ -60,30 +112,68 @@ class AnalysisEngine:
                     dependencies_analyzed=0,
                     vulnerabilities_found=0,
                     real_threats=0,
-                    analysis_duration=time.time() - start_time,
+                    analysis_duration=time.perf_counter() - start_time,
                     errors=["No dependencies found in repository"]
                 )
 
-            # Step 3: Check which dependencies are actually used
-            dependency_usage = {}
-            for dep in dependencies:
-                dependency_usage[dep.name] = self.dependency_service.is_dependency_used(dep, repo_path)
-
-            # Step 4: Query vulnerabilities
-            all_vulnerabilities = await self._analyze_vulnerabilities(dependencies)
+            # The same package can be declared by several manifests; look each one up once
+            unique_dependencies = self._deduplicate_dependencies(dependencies)
+
+            # Step 3: Query vulnerabilities
+            all_vulnerabilities = await self._analyze_vulnerabilities(unique_dependencies)
+
+            # Step 4: Generate repository context for triage, from every file of the
+            # commit rather than only those the sparse checkout kept
+            try:
+                file_paths = await self.repository_service.list_files(repo_path)
+            except RuntimeError:
+                file_paths = []
+            repo_context = self._generate_repo_context(dependencies, file_paths)
+
+            # Step 5: Perform LLM-based triage, one prompt per group of vulnerabilities,
+            # with the groups triaged concurrently. Transitive dependencies that are not
+            # used in the code are triaged by rule, without an LLM call.
+            triage_results: Dict[int, TriageResult] = {}
+            pending = []
+            for index, (vuln, dep) in enumerate(all_vulnerabilities):
+                if dep.is_direct or dependency_usage.get(dep.name, True):
+                    pending.append(index)
+                else:
+                    triage_results[index] = self._unused_transitive_triage(dep)
+
+            groups = [
+                pending[i:i + self.triage_batch_size]
+                for i in range(0, len(pending), self.triage_batch_size)
+            ]
+            semaphore = asyncio.Semaphore(self.triage_concurrency)
+            group_results = await asyncio.gather(
+                *(
+                    self._triage_with_limit(
+                        semaphore, [all_vulnerabilities[i] for i in group], repo_context, dependency_usage
+                    )
+                    for group in groups
+                ),
+                return_exceptions=True
+            )
 
-            # Step 5: Generate repository context for triage
-            repo_context = self._generate_repo_context(repo_path, dependencies)
+            for group, results in zip(groups, group_results):
+                if isinstance(results, Exception):
+                    # Keep the vulnerabilities in the report with the rule-based verdict
+                    for i in group:
+                        vuln, dep = all_vulnerabilities[i]
+                        errors.append(f"Triage failed for {vuln.id} ({dep.name}): {str(results)}")
+                        triage_results[i] = fallback_triage(vuln, dep, dependency_usage.get(dep.name, True))
+                    continue
+                triage_results.update(zip(group, results))
 
-            # Step 6: Perform LLM-based triage
             vulnerability_reports = []
-            for vuln, dep in all_vulnerabilities:
-                triage_result = await self.triage_service.triage_vulnerability(
-                    vuln, dep, repo_context, dependency_usage.get(dep.name, True)
-                )
+            for index, (vuln, dep) in enumerate(all_vulnerabilities):
+                triage_result = triage_results.get(index)
+                if triage_result is None:
+                    continue
 
-                # Create vulnerability report
-                report = VulnerabilityReport(
+                # Create vulnerability report (inputs are already validated models)
+                report = VulnerabilityReport.model_construct(
                     vulnerability=vuln,
                     dependency=dep.name,
                     dependency_version=dep.version,
@@ -101,76 +191,118 @@ class AnalysisEngine:
                 )
                 vulnerability_reports.append(report)
 
-            # Step 7: Calculate summary statistics
+            # Step 6: Calculate summary statistics
             real_threats = sum(1 for report in vulnerability_reports if report.is_real_threat)
             threat_counts = self._calculate_threat_counts(vulnerability_reports)
 
-            # Step 8: Clean up
-            self.repository_service.cleanup()
+            # Step 7: Clean up
+            await asyncio.to_thread(self.repository_service.cleanup, repo_path)
 
-            analysis_duration = time.time() - start_time
-
-            return AnalysisResponse(
+            # Every component was validated when it was built, so skip re-validating
+            # the (potentially large) report lists
+            return AnalysisResponse.model_construct(
                 report_id=report_id,
                 repo_url=str(request.repo_url),
                 analysis_timestamp=datetime.now(),
                 dependencies_analyzed=len(dependencies),
                 vulnerabilities_found=len(vulnerability_reports),
                 real_threats=real_threats,
-                critical_count=threat_counts.get(ThreatLevel.CRITICAL, 0),
-                high_count=threat_counts.get(ThreatLevel.HIGH, 0),
-                medium_count=threat_counts.get(ThreatLevel.MEDIUM, 0),
-                low_count=threat_counts.get(ThreatLevel.LOW, 0),
+                critical_count=threat_counts[ThreatLevel.CRITICAL],
+                high_count=threat_counts[ThreatLevel.HIGH],
+                medium_count=threat_counts[ThreatLevel.MEDIUM],
+                low_count=threat_counts[ThreatLevel.LOW],
                 vulnerability_reports=vulnerability_reports,
                 dependencies=dependencies,
-                analysis_duration=analysis_duration,
+                analysis_duration=time.perf_counter() - start_time,
                 errors=errors
             )
 
         except Exception as e:
             # Clean up on error
-            self.repository_service.cleanup()
+            if repo_path is not None:
+                await asyncio.to_thread(self.repository_service.cleanup, repo_path)
             errors.append(f"Analysis failed: {str(e)}")
 
             return AnalysisResponse(
                 report_id=report_id,
                 repo_url=str(request.repo_url),
+                status=AnalysisStatus.FAILED,
                 analysis_timestamp=datetime.now(),
                 dependencies_analyzed=0,
                 vulnerabilities_found=0,
                 real_threats=0,
-                analysis_duration=time.time() - start_time,
+                analysis_duration=time.perf_counter() - start_time,
                 errors=errors
             )
 
+    def _unused_transitive_triage(self, dependency: Dependency) -> TriageResult:
+        """Rule-based triage for a vulnerability in a transitive dependency the code never imports"""
+        return TriageResult(
+            is_real_threat=False,
+            threat_level=ThreatLevel.LOW,
+            impact_summary=f"Vulnerability in unused transitive dependency {dependency.name} {dependency.version}",
+            recommendation="Monitor for updates but no immediate action required",
+            confidence=0.9,
+            reasoning="LLM triage skipped: the dependency is transitive and not used in the codebase"
+        )
+
+    async def _triage_with_limit(
+        self,
+        semaphore: asyncio.Semaphore,
+        group: List[Tuple[Vulnerability, Dependency]],
+        repo_context: str,
+        dependency_usage: Dict[str, bool]
+    ) -> List[TriageResult]:
+        """Triage a group of vulnerabilities while holding a slot of the concurrency limit"""
+        items = [(vuln, dep, dependency_usage.get(dep.name, True)) for vuln, dep in group]
+        async with semaphore:
+            return await self.triage_service.triage_batch(items, repo_context)
+
+    def _deduplicate_dependencies(self, dependencies: List[Dependency]) -> List[Dependency]:
+        """Drop repeated (type, name, version) dependencies, preferring direct declarations"""
+        unique: Dict[Tuple[DependencyType, str, str], Dependency] = {}
+        for dep in dependencies:
+            key = dep.version_key
+            existing = unique.get(key)
+            if existing is None or (dep.is_direct and not existing.is_direct):
+                unique[key] = dep
+        return list(unique.values())
+
     async def _analyze_vulnerabilities(self, dependencies: List[Dependency]) -> List[Tuple[Vulnerability, Dependency]]:
         """
         Queries vulnerabilities for a list of dependencies using the OSV API.
         Returns a list of tuples (Vulnerability, Dependency).
         """
         all_vulnerabilities = []
-        async with VulnerabilityService(self.osv_api_url) as vuln_service:
+        deps_by_key = {d.version_key: d for d in dependencies}
+        async with VulnerabilityService(
+            self.osv_api_url,
+            cache=self.cache_service,
+            cache_ttl=self.osv_cache_ttl,
+            session=self.osv_session,
+            batch_size=self.osv_batch_size
+        ) as vuln_service:
             vuln_by_dependency = await vuln_service.get_vulnerabilities_batch(dependencies)
 
             # Flatten vulnerabilities and filter by version
-            for dep_name, vulnerabilities in vuln_by_dependency.items():
+            for key, vulnerabilities in vuln_by_dependency.items():
+                dep = deps_by_key.get(key)
                 for vuln in vulnerabilities:
-                    # Find the corresponding dependency
-                    dep = next((d for d in dependencies if d.name == dep_name), None)
                     if dep and vuln_service.is_vulnerability_affecting_version(vuln, dep):
                         all_vulnerabilities.append((vuln, dep))
         return all_vulnerabilities
 
-    def _generate_repo_context(self, repo_path: Path, dependencies: List[Dependency]) -> str:
+    def _generate_repo_context(self, dependencies: List[Dependency], file_paths: List[str]) -> str:
         """Generate context about the repository for LLM triage"""
         context_parts = []
 
         # Repository structure
         context_parts.append(f"Repository contains {len(dependencies)} dependencies")
 
-        # Dependency types
-        npm_count = sum(1 for d in dependencies if d.dependency_type == "npm")
-        python_count = sum(1 for d in dependencies if d.dependency_type == "python")
+        # Dependency types and direct vs transitive, counted in a single pass
+        counts = Counter((d.dependency_type, d.is_direct) for d in dependencies)
+        npm_count = counts[(DependencyType.NPM, True)] + counts[(DependencyType.NPM, False)]
+        python_count = counts[(DependencyType.PYTHON, True)] + counts[(DependencyType.PYTHON, False)]
 
         if npm_count > 0:
             context_parts.append(f"JavaScript/Node.js dependencies: {npm_count}")
@@ -178,25 +310,33 @@ class AnalysisEngine:
             context_parts.append(f"Python dependencies: {python_count}")
 
         # Direct vs transitive
-        direct_count = sum(1 for d in dependencies if d.is_direct)
+        direct_count = sum(count for (_, is_direct), count in counts.items() if is_direct)
         transitive_count = len(dependencies) - direct_count
         context_parts.append(f"Direct dependencies: {direct_count}, Transitive: {transitive_count}")
 
         # Repository files (basic analysis)
-        file_extensions = set()
-        for file_path in repo_path.rglob('*'):
-            if file_path.is_file():
-                file_extensions.add(file_path.suffix)
+        file_extensions = self._collect_extensions(file_paths)
 
         if file_extensions:
             context_parts.append(f"File types found: {', '.join(sorted(file_extensions))}")
 
         return "\n".join(context_parts)
 
-    def _calculate_threat_counts(self, vulnerability_reports: List[VulnerabilityReport]) -> Dict[ThreatLevel, int]:
-        """Calculate counts by threat level"""
-        counts = {}
-        for report in vulnerability_reports:
-            level = report.threat_level
-            counts[level] = counts.get(level, 0) + 1
-        return counts
+    def _collect_extensions(self, file_paths: List[str], cap: int = MAX_CONTEXT_EXTENSIONS) -> Set[str]:
+        """
+        Collect the most common file suffixes of the repository's files, up to ``cap``
+
+        Files in vendored and build directories (SKIP_DIRS) are not counted.
+        """
+        suffix_counts = Counter(
+            os.path.splitext(path)[1]
+            for path in file_paths
+            if SKIP_DIRS.isdisjoint(path.split("/")[:-1])
+        )
+        # Files without a suffix (LICENSE, Makefile) are not a file type
+        common = [suffix for suffix, _ in suffix_counts.most_common(cap + 1) if suffix]
+        return set(common[:cap])
+
+    def _calculate_threat_counts(self, vulnerability_reports: List[VulnerabilityReport]) -> "Counter[ThreatLevel]":
+        """Calculate counts by threat level (levels without reports count as 0)"""
+        return Counter(report.threat_level for report in vulnerability_reports)
@@ -0,0 +1,40 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Tuple
+
+from ..models.analysis import TriageResult
+from ..models.dependency import Dependency
+from ..models.vulnerability import Vulnerability
+
+
+class RepositoryServiceProto(Protocol):
+    """What the analysis engine needs from the repository service"""
+
+    def validate_repo_url(self, repo_url: str) -> None:
+        ...
+
+    async def clone_repository(self, repo_url: str) -> Path:
+        ...
+
+    async def list_files(self, repo_path: Path) -> List[str]:
+        ...
+
+    def cleanup(self, repo_path: Optional[Path] = None) -> None:
+        ...
+
+
+class DependencyServiceProto(Protocol):
+    """What the analysis engine needs from the dependency service"""
+
+    async def analyze(self, repo_path: Path) -> Tuple[List[Dependency], Dict[str, bool]]:
+        ...
+
+
+class TriageServiceProto(Protocol):
+    """What the analysis engine needs from the triage service"""
+
+    async def triage_batch(
+        self,
+        items: List[Tuple[Vulnerability, Dependency, bool]],
+        repo_context: str
+    ) -> List[TriageResult]:
+        ...
@@ -1,12 +1,62 @@
+import asyncio
 import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+import aiohttp
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+
+from config.settings import get_settings, load_env_file, validate_settings
+from .services.dependency_service import create_scan_executor
 
 # Load environment variables from .env file
-load_dotenv()
+load_env_file()
+
+from .api.routes import router, get_analysis_engine
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up process-wide resources shared by all analyses"""
+    # Refuse to start with a configuration analyses would fail on
+    errors = validate_settings()
+    if errors:
+        raise RuntimeError(f"Invalid configuration: {'; '.join(errors)}")
+
+    # Size the default thread pool used for repository file scans
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+    )
+
+    # Pooled HTTP session so OSV requests reuse connections across analyses
+    session = aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60),
+        timeout=aiohttp.ClientTimeout(total=30)
+    )
+    app.state.osv_session = session
+    analysis_engine = get_analysis_engine()
+    analysis_engine.osv_session = session
+
+    # One process pool for the usage scans of large repositories, rather than
+    # spawning interpreters for every analysis; the CPUs are split between the
+    # pools of the WEB_CONCURRENCY server processes
+    scan_executor = create_scan_executor(
+        max(1, (os.cpu_count() or 1) // get_settings().WEB_CONCURRENCY)
+    )
+    analysis_engine.dependency_service.scan_executor = scan_executor
+
+    yield
+
+    analysis_engine.osv_session = None
+    analysis_engine.dependency_service.scan_executor = None
+    # Joining the spawned processes blocks, so wait for them off the event loop
+    await asyncio.to_thread(scan_executor.shutdown, cancel_futures=True)
+    await session.close()
 
-from .api.routes import router
 
 # Create FastAPI app
 app = FastAPI(
@@ -14,18 +64,25 @@ app = FastAPI(
     description="A cybersecurity tool that analyzes GitHub repositories for dependency vulnerabilities",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
-# Add CORS middleware
+# Add CORS middleware (ALLOWED_ORIGINS is a comma-separated list of origins)
+allowed_origins = list(get_settings().ALLOWED_ORIGINS)
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # Configure appropriately for production
-    allow_credentials=True,
-    allow_methods=["*"],
+    allow_origins=allowed_origins,
+    allow_credentials="*" not in allowed_origins,
+    allow_methods=["GET", "POST", "DELETE"],
     allow_headers=["*"],
 )
 
+# Compress responses; analysis reports are large, highly repetitive JSON
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
 # Include API routes
 app.include_router(router, prefix="/api/v1", tags=["analysis"])
 
@@ -45,14 +102,21 @@ async def root():
 if __name__ == "__main__":
     import uvicorn
 
-    # Check for required environment variables
-    if not os.getenv("OPENAI_API_KEY"):
-        print("Warning: OPENAI_API_KEY environment variable is not set")
-        print("LLM-based triage will not work without this key")
+    # Exit with the configuration errors rather than a failed startup traceback
+    errors = validate_settings()
+    if errors:
+        print("Configuration errors:")
+        for error in errors:
+            print(f"• {error}")
+        sys.exit(1)
 
+    settings = get_settings()
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        loop="uvloop",
+        http="httptools",
+        workers=settings.WEB_CONCURRENCY,
+        reload=settings.API_RELOAD
     )
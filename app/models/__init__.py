@@ -1,6 +1,6 @@
 from .vulnerability import Vulnerability, VulnerabilityReport
 from .dependency import Dependency, DependencyType
-from .analysis import AnalysisRequest, AnalysisResponse, TriageResult
+from .analysis import AnalysisRequest, AnalysisResponse, AnalysisStatus, TriageResult
 
 __all__ = [
     "Vulnerability",
@@ -9,5 +9,6 @@ __all__ = [
     "DependencyType",
     "AnalysisRequest",
     "AnalysisResponse",
+    "AnalysisStatus",
     "TriageResult"
 ]
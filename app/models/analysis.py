@@ -1,4 +1,5 @@
 from datetime import datetime
+from enum import Enum
 from typing import Dict, List, Optional, Any
 
 from pydantic import BaseModel, ConfigDict, HttpUrl
@@ -26,13 +27,22 @@ class TriageResult(BaseModel):
     confidence: float
     reasoning: str
 
-    model_config = ConfigDict(from_attributes=True)
+    # Cached verdicts are handed out to every caller asking the same question
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+
+class AnalysisStatus(str, Enum):
+    """Lifecycle state of an analysis report"""
+    PENDING = "pending"
+    DONE = "done"
+    FAILED = "failed"
 
 
 class AnalysisResponse(BaseModel):
     """Response from repository analysis"""
     report_id: str
     repo_url: str
+    status: AnalysisStatus = AnalysisStatus.DONE
     analysis_timestamp: datetime
     dependencies_analyzed: int
     vulnerabilities_found: int
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from pydantic import BaseModel, ConfigDict
 
 
@@ -27,3 +27,8 @@ class Dependency(BaseModel):
     def package_key(self) -> str:
         """Unique key for package identification"""
         return f"{self.dependency_type}:{self.name}"
+
+    @property
+    def version_key(self) -> Tuple[DependencyType, str, str]:
+        """Unique key for a specific version of a package"""
+        return (self.dependency_type, self.name, self.version)
@@ -25,7 +25,8 @@ class Vulnerability(BaseModel):
     modified: Optional[datetime] = None
     database_specific: Dict[str, Any] = {}
 
-    model_config = ConfigDict(from_attributes=True)
+    # One instance is shared by every dependency it affects, so it must not change
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 
 class VulnerabilityReport(BaseModel):
@@ -40,4 +41,4 @@ class VulnerabilityReport(BaseModel):
     evidence: Dict[str, Any]
     triage_confidence: float
 
-    model_config = ConfigDict(from_attributes=True)
+    model_config = ConfigDict(from_attributes=True, frozen=True)
@@ -2,10 +2,14 @@ from .repository_service import RepositoryService
 from .dependency_service import DependencyService
 from .vulnerability_service import VulnerabilityService
 from .triage_service import TriageService
+from .report_service import ReportService
+from .cache_service import CacheService
 
 __all__ = [
     "RepositoryService",
     "DependencyService",
     "VulnerabilityService",
-    "TriageService"
+    "TriageService",
+    "ReportService",
+    "CacheService"
 ]
@@ -0,0 +1,76 @@
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+
+class CacheService:
+    """Persistent key/value cache with per-entry expiry, backed by SQLite"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the database on first use"""
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                Path(self.db_path).expanduser().parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(Path(self.db_path).expanduser()), check_same_thread=False)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for a key, or None if missing or expired"""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Return the cached values of all keys that are present and not expired"""
+        keys = list(keys)
+        if not keys:
+            return {}
+
+        now = time.time()
+        values = {}
+        with self._lock:
+            conn = self._connection()
+            # Stay well below SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, value FROM cache WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now)
+                ).fetchall()
+                values.update(rows)
+        return values
+
+    def set(self, key: str, value: str, expire: float) -> None:
+        """Cache a value for ``expire`` seconds"""
+        self.set_many({key: value}, expire)
+
+    def set_many(self, items: Dict[str, str], expire: float) -> None:
+        """Cache several values for ``expire`` seconds, dropping expired entries"""
+        if not items:
+            return
+
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                    [(key, value, now + expire) for key, value in items.items()]
+                )
+
+    def close(self):
+        """Close the underlying database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -1,18 +1,295 @@
-import json
+import asyncio
+import contextlib
+import itertools
+import mmap
+import multiprocessing
+import os
 import re
+import tomllib
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Dict, Any, Set
-import toml
+from typing import List, Dict, Any, Iterable, Iterator, NamedTuple, Optional, Sequence, Tuple
+import orjson
 from packaging import version
 
 from ..models.dependency import Dependency, DependencyType
 
+# Source file extensions inspected for imports, per dependency type
+USAGE_EXTENSIONS = {
+    DependencyType.NPM: ('.js', '.jsx', '.ts', '.tsx'),
+    DependencyType.PYTHON: ('.py',),
+}
+ALL_USAGE_EXTENSIONS = tuple(sorted({ext for extensions in USAGE_EXTENSIONS.values() for ext in extensions}))
+
+# Literal keywords every import matched by IMPORT_PATTERNS contains. Looking for
+# them with ``find`` (a plain substring search, which unlike ``in`` also works on
+# mmaps) is far cheaper than running the pattern, so files without any import
+# statement skip the regex entirely.
+USAGE_KEYWORDS = {
+    DependencyType.NPM: (b'import', b'require(', b'from '),
+    DependencyType.PYTHON: (b'import ',),
+}
+
+# Import statements per ecosystem, capturing the imported module or package specifier
+# as the pattern's last group (e.g. "lodash/fp" or "requests.adapters")
+IMPORT_PATTERNS = {
+    DependencyType.NPM: re.compile(rb"(?:import[^\n]*?|require\(|from )['\"]([^'\"\n]+)['\"]"),
+    DependencyType.PYTHON: re.compile(
+        rb"^[ \t]*(?:from[ \t]+([A-Za-z_][\w.]*)[ \t]+import|import[ \t]+([A-Za-z_][\w.]*))", re.MULTILINE
+    ),
+}
+
+# Directories of vendored packages, build output and tooling; their files are not the
+# repository's own code (installed packages would otherwise match their own imports)
+SKIP_DIRS = {'.git', 'node_modules', 'dist', 'build', '.next', '.venv', 'venv', '__pycache__', 'target'}
+
+# Minified bundles are build output, not source that imports dependencies
+MINIFIED_SUFFIXES = ('.min.js',)
+
+# Source files at least this large are scanned through mmap instead of being copied
+# into memory; larger than the maximum they are treated as generated and skipped
+MMAP_MIN_SIZE = 4 * 1024
+MAX_SCAN_FILE_SIZE = 10 * 1024 * 1024
+
+# Repositories with more source files than this are scanned by a pool of processes,
+# in chunks of PARALLEL_SCAN_CHUNK_SIZE files; below it the pool startup costs more
+# than it saves
+PARALLEL_SCAN_MIN_FILES = 500
+PARALLEL_SCAN_CHUNK_SIZE = 64
+
+
+# A requirement line: name, optional [extras], then an optional version specifier whose
+# leading operator is dropped (e.g. "requests[socks]>=2.25.0,<3.0.0; python_version>'3'"
+# gives "requests" and "2.25.0,<3.0.0"). Surrounding whitespace and trailing comments
+# are skipped by the pattern itself. Lines that do not start with a package name, such
+# as comments, options or URLs, do not match.
+REQUIREMENT_PATTERN = re.compile(
+    r"\s*([A-Za-z0-9][A-Za-z0-9._-]*)(?=[\s\[=<>!~;#]|$)\s*(?:\[[^\]]*\])?\s*"
+    r"(?:(===|==|~=|!=|>=|<=|>|<|=)\s*([^;#]*))?"
+)
+
+
+class NpmLockEntries(NamedTuple):
+    """
+    Packages of a package-lock.json, stored column-wise
+
+    Large lockfiles list thousands of packages; parallel lists hold one pointer per
+    field instead of allocating nested dicts per package. ``index`` maps a package
+    name to its position in the lists.
+    """
+    names: List[str]
+    versions: List[str]
+    parents: List[Optional[str]]
+    integrities: List[Optional[str]]
+    resolveds: List[Optional[str]]
+    index: Dict[str, int]
+
+    @classmethod
+    def empty(cls) -> "NpmLockEntries":
+        """An empty set of entries to add packages to"""
+        return cls([], [], [], [], [], {})
+
+    def add(self, name: str, version: str, parent: Optional[str], integrity: Optional[str], resolved: Optional[str]):
+        """Record a package, replacing an earlier entry of the same name"""
+        position = self.index.get(name)
+        if position is None:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+            self.versions.append(version)
+            self.parents.append(parent)
+            self.integrities.append(integrity)
+            self.resolveds.append(resolved)
+        else:
+            self.versions[position] = version
+            self.parents[position] = parent
+            self.integrities[position] = integrity
+            self.resolveds[position] = resolved
+
+
+@contextlib.contextmanager
+def _source_content(file_path: str) -> Iterator[Any]:
+    """
+    Open a source file for matching
+
+    Small files are read, larger ones memory-mapped so the OS pages them in as the
+    pattern advances. Yields None for files over MAX_SCAN_FILE_SIZE.
+    """
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size > MAX_SCAN_FILE_SIZE:
+            yield None
+        elif size < MMAP_MIN_SIZE:
+            yield f.read()
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                yield content
+
+
+def _imported_package(dependency_type: DependencyType, specifier: str) -> Optional[str]:
+    """The lowercased package an import specifier refers to, or None for relative imports"""
+    if dependency_type == DependencyType.NPM:
+        if specifier.startswith(('.', '/')):
+            return None
+        parts = specifier.split('/')
+        return ('/'.join(parts[:2]) if specifier.startswith('@') else parts[0]).lower()
+    return specifier.partition('.')[0].lower()
+
+
+class UsageMatcher(NamedTuple):
+    """
+    The dependencies of one ecosystem still to be found in the source files
+
+    ``names`` maps lowercased package names to dependency names; found names are
+    removed from it.
+    """
+    dependency_type: DependencyType
+    extensions: Tuple[str, ...]
+    keywords: Tuple[bytes, ...]
+    pattern: re.Pattern
+    names: Dict[str, str]
+
+
+def _scan_files(file_paths: Iterable[str], matchers: List[UsageMatcher], usage: Dict[str, bool]) -> None:
+    """Mark the dependencies imported by the given files as used, stopping once all are found"""
+    for file_path in file_paths:
+        active = [m for m in matchers if file_path.endswith(m.extensions)]
+        if not active:
+            continue
+        try:
+            with _source_content(file_path) as content:
+                if content is not None:
+                    _record_usage(content, active, usage)
+        except (OSError, ValueError):
+            continue
+
+        # Stop scanning an ecosystem once all of its dependencies were found,
+        # and the files once every dependency was
+        if not all(m.names for m in active):
+            matchers = [m for m in matchers if m.names]
+            if not matchers:
+                break
+
+
+def _record_usage(content, matchers: List[UsageMatcher], usage: Dict[str, bool]) -> None:
+    """
+    Mark every dependency whose package is imported in the file content as used
+
+    Found names are removed from the matcher's ``names``, which therefore holds
+    the dependencies still to be found.
+    """
+    for dependency_type, _, keywords, pattern, names in matchers:
+        if not names or all(content.find(keyword) == -1 for keyword in keywords):
+            continue
+        for match in pattern.finditer(content):
+            specifier = match.group(match.lastindex).decode('utf-8', errors='replace')
+            name = names.pop(_imported_package(dependency_type, specifier), None)
+            if name is not None:
+                usage[name] = True
+                if not names:
+                    break
+
+
+def _scan_files_worker(file_paths: List[str], matchers: List[UsageMatcher]) -> Dict[str, bool]:
+    """
+    Scan a chunk of files in a worker process, returning the dependencies found
+
+    The matchers travel with each chunk, so one pool can serve any number of scans.
+    """
+    usage: Dict[str, bool] = {}
+    _scan_files(file_paths, matchers, usage)
+    return usage
+
+
+def create_scan_executor(max_workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Create a process pool for scanning large repositories
+
+    Processes are spawned rather than forked because scans run in worker threads of
+    the event loop. A long-running server should create one and share it, since
+    spawning the interpreters costs more than a typical scan.
+
+    Args:
+        max_workers: Number of scan processes; by default one per CPU
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class RepoScan:
+    """What one walk of a repository found"""
+    # Files with one of the ALL_USAGE_EXTENSIONS, to be scanned for imports
+    source_files: Tuple[str, ...]
+
+
+def scan_repository(root: str) -> RepoScan:
+    """
+    Walk the tree under root once, listing the source files scanned for imports
+
+    Directories in SKIP_DIRS are pruned from the walk. ``os.scandir`` is used directly:
+    its entries carry the file type from the directory listing, so there is no stat
+    call per file.
+
+    Not cached, since the tree may change between calls: an analysis walks its clone
+    once and hands the scan to whatever needs it.
+    """
+    source_files = []
+    pending = [root]
+    while pending:
+        try:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            pending.append(entry.path)
+                    elif entry.is_file() and entry.name.endswith(ALL_USAGE_EXTENSIONS):
+                        source_files.append(entry.path)
+        except OSError:
+            continue
+    return RepoScan(tuple(source_files))
+
+
+def _list_source_files(root: str, extensions: Tuple[str, ...]) -> Tuple[str, ...]:
+    """List the files under root with one of the given extensions"""
+    return tuple(path for path in scan_repository(root).source_files if path.endswith(extensions))
+
 
 class DependencyService:
     """Service for parsing and resolving dependencies from package files"""
 
-    def __init__(self, max_dependencies: int = 1000):
+    def __init__(self, max_dependencies: int = 1000, scan_executor: Optional[Executor] = None):
         self.max_dependencies = max_dependencies
+        # Optional shared process pool for large scans, left running by the service;
+        # without one, each large scan starts (and stops) a pool of its own
+        self.scan_executor = scan_executor
+
+    async def analyze(self, repo_path: Path) -> Tuple[List[Dependency], Dict[str, bool]]:
+        """
+        Extract the dependencies of a repository and check which ones are used
+
+        The source files of every ecosystem are listed while the manifests are parsed,
+        so the single directory walk overlaps the parsing. Once the dependencies are
+        known, the listed files are scanned for their imports.
+
+        Args:
+            repo_path: Path to the repository root
+
+        Returns:
+            The dependencies, and a dictionary mapping their names to whether they
+            appear to be used
+        """
+        dependencies, repo_scan = await asyncio.gather(
+            self.extract_dependencies(repo_path),
+            asyncio.to_thread(scan_repository, str(repo_path))
+        )
+        if not dependencies:
+            return dependencies, {}
+
+        usage = await asyncio.to_thread(self.scan_usage, dependencies, repo_path, repo_scan.source_files)
+        return dependencies, usage
 
     async def extract_dependencies(self, repo_path: Path) -> List[Dependency]:
         """
@@ -24,36 +301,51 @@ class DependencyService:
         Returns:
             List of all dependencies found
         """
-        dependencies = []
-
-        # Check for JavaScript/Node.js dependencies
-        if (repo_path / "package.json").exists():
-            npm_deps = await self._parse_npm_dependencies(repo_path)
-            dependencies.extend(npm_deps)
-
-        # Check for Python dependencies
-        if (repo_path / "requirements.txt").exists():
-            python_deps = await self._parse_requirements_txt(repo_path)
-            dependencies.extend(python_deps)
+        parsers = [
+            # JavaScript/Node.js dependencies
+            ("package.json", self._iter_npm_dependencies),
+            # Python dependencies
+            ("requirements.txt", self._iter_requirements_txt),
+            ("pyproject.toml", self._iter_pyproject_toml)
+        ]
 
-        if (repo_path / "pyproject.toml").exists():
-            poetry_deps = await self._parse_pyproject_toml(repo_path)
-            dependencies.extend(poetry_deps)
+        # Manifests are looked up and parsed synchronously, so run the parsers
+        # concurrently in worker threads to overlap their I/O and keep the event loop
+        # responsive. A manifest that cannot be parsed does not discard the
+        # dependencies of the others.
+        results = await asyncio.gather(
+            *(asyncio.to_thread(self._parse_manifest, repo_path, manifest, parser) for manifest, parser in parsers),
+            return_exceptions=True
+        )
+        parsed = []
+        for (manifest, _), result in zip(parsers, results):
+            if isinstance(result, Exception):
+                print(f"Error parsing {manifest}: {result}")
+            else:
+                parsed.append(result)
 
         # Limit the number of dependencies
-        if len(dependencies) > self.max_dependencies:
-            dependencies = dependencies[:self.max_dependencies]
+        return list(itertools.islice(itertools.chain.from_iterable(parsed), self.max_dependencies))
 
-        return dependencies
+    def _parse_manifest(self, repo_path: Path, manifest: str, parser) -> List[Dependency]:
+        """
+        Parse a manifest with the given parser, if the repository has it
 
-    async def _parse_npm_dependencies(self, repo_path: Path) -> List[Dependency]:
+        Parsers yield dependencies lazily, so no more than max_dependencies of them
+        are ever built from one manifest.
+        """
+        if not (repo_path / manifest).exists():
+            return []
+        with contextlib.closing(parser(repo_path)) as dependencies:
+            return list(itertools.islice(dependencies, self.max_dependencies))
+
+    def _iter_npm_dependencies(self, repo_path: Path) -> Iterator[Dependency]:
         """Parse npm dependencies from package.json and package-lock.json"""
         dependencies = []
 
         # Parse package.json for direct dependencies
         package_json_path = repo_path / "package.json"
-        with open(package_json_path, 'r') as f:
-            package_data = json.load(f)
+        package_data = orjson.loads(package_json_path.read_bytes())
 
         # Extract direct dependencies
         direct_deps = {}
@@ -70,88 +362,122 @@ class DependencyService:
             ))
 
         # Parse package-lock.json for exact versions and transitive dependencies
+        lock = NpmLockEntries.empty()
         lock_file_path = repo_path / "package-lock.json"
         if lock_file_path.exists():
-            with open(lock_file_path, 'r') as f:
-                lock_data = json.load(f)
+            lock_data = orjson.loads(lock_file_path.read_bytes())
 
             # Extract all dependencies with exact versions
-            all_deps = self._extract_npm_lock_dependencies(lock_data)
-
-            # Update existing dependencies with exact versions
-            for dep in dependencies:
-                if dep.name in all_deps:
-                    dep.version = all_deps[dep.name]["version"]
-                    dep.metadata.update(all_deps[dep.name].get("metadata", {}))
-
-            # Add transitive dependencies
-            for name, dep_info in all_deps.items():
-                if not any(d.name == name for d in dependencies):
-                    dependencies.append(Dependency(
-                        name=name,
-                        version=dep_info["version"],
-                        dependency_type=DependencyType.NPM,
-                        is_direct=False,
-                        parent=dep_info.get("parent"),
-                        metadata=dep_info.get("metadata", {})
-                    ))
+            lock = self._extract_npm_lock_dependencies(lock_data)
+
+        # Update direct dependencies with exact versions in a single pass over the
+        # lockfile entries, noting the transitive ones
+        direct_by_name = {dep.name: dep for dep in dependencies}
+        transitive = []
+        for i, name in enumerate(lock.names):
+            direct = direct_by_name.get(name)
+            if direct is not None:
+                direct.version = lock.versions[i]
+                direct.metadata.update({"integrity": lock.integrities[i], "resolved": lock.resolveds[i]})
+            else:
+                transitive.append(i)
+
+        yield from dependencies
+
+        # Transitive dependencies are only built as they are consumed
+        for i in transitive:
+            yield Dependency(
+                name=lock.names[i],
+                version=lock.versions[i],
+                dependency_type=DependencyType.NPM,
+                is_direct=False,
+                parent=lock.parents[i],
+                metadata={"integrity": lock.integrities[i], "resolved": lock.resolveds[i]}
+            )
+
+    def _extract_npm_lock_dependencies(self, lock_data: Dict[str, Any]) -> NpmLockEntries:
+        """
+        Extract all dependencies from package-lock.json
+
+        Lockfile v2/v3 already list every installed package once in the flat
+        ``packages`` map, which is used when present. Older lockfiles only have the
+        nested ``dependencies`` tree, which is walked depth-first with an explicit
+        stack of iterators, so deeply nested lockfiles cannot hit the recursion limit.
+        """
+        packages = lock_data.get("packages")
+        if isinstance(packages, dict):
+            return self._extract_npm_lock_packages(packages)
+
+        dependencies = NpmLockEntries.empty()
+
+        root = lock_data.get("dependencies")
+        stack = [(iter(root.items()), None)] if isinstance(root, dict) else []
+        while stack:
+            entries, parent = stack[-1]
+            entry = next(entries, None)
+            if entry is None:
+                stack.pop()
+                continue
+
+            name, dep_info = entry
+            if isinstance(dep_info, dict) and "version" in dep_info:
+                dependencies.add(
+                    name, dep_info["version"], parent, dep_info.get("integrity"), dep_info.get("resolved")
+                )
+
+                # Process nested dependencies
+                nested = dep_info.get("dependencies")
+                if isinstance(nested, dict):
+                    stack.append((iter(nested.items()), name))
 
         return dependencies
 
-    def _extract_npm_lock_dependencies(self, lock_data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
-        """Extract all dependencies from package-lock.json"""
-        dependencies = {}
-
-        def process_dependencies(deps: Dict[str, Any], parent: str = None):
-            for name, dep_info in deps.items():
-                if isinstance(dep_info, dict) and "version" in dep_info:
-                    dependencies[name] = {
-                        "version": dep_info["version"],
-                        "parent": parent,
-                        "metadata": {
-                            "integrity": dep_info.get("integrity"),
-                            "resolved": dep_info.get("resolved")
-                        }
-                    }
-
-                    # Process nested dependencies
-                    if "dependencies" in dep_info:
-                        process_dependencies(dep_info["dependencies"], name)
-
-        if "dependencies" in lock_data:
-            process_dependencies(lock_data["dependencies"])
+    def _extract_npm_lock_packages(self, packages: Dict[str, Any]) -> NpmLockEntries:
+        """Extract all dependencies from the flat ``packages`` map of a v2/v3 lockfile"""
+        dependencies = NpmLockEntries.empty()
+
+        # Keys are install paths such as "node_modules/a/node_modules/b". Visit hoisted
+        # packages first so that the version resolved at the top level wins.
+        for path in sorted(packages, key=lambda p: p.count("node_modules/")):
+            dep_info = packages[path]
+            if "node_modules/" not in path or not isinstance(dep_info, dict) or "version" not in dep_info:
+                continue  # The root project, workspace sources and links
+
+            parent_path, _, name = path.rpartition("node_modules/")
+            if name in dependencies.index:
+                continue
+
+            parent = parent_path.rstrip("/").rpartition("node_modules/")[2] or None
+            dependencies.add(name, dep_info["version"], parent, dep_info.get("integrity"), dep_info.get("resolved"))
 
         return dependencies
 
-    async def _parse_requirements_txt(self, repo_path: Path) -> List[Dependency]:
+    def _iter_requirements_txt(self, repo_path: Path) -> Iterator[Dependency]:
         """Parse Python dependencies from requirements.txt"""
-        dependencies = []
         requirements_path = repo_path / "requirements.txt"
 
         with open(requirements_path, 'r') as f:
             for line in f:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    # Parse requirement line (e.g., "requests>=2.25.0,<3.0.0")
-                    name, version_spec = self._parse_requirement_line(line)
-                    if name:
-                        dependencies.append(Dependency(
-                            name=name,
-                            version=version_spec,
-                            dependency_type=DependencyType.PYTHON,
-                            is_direct=True,
-                            metadata={"source": "requirements.txt"}
-                        ))
-
-        return dependencies
-
-    async def _parse_pyproject_toml(self, repo_path: Path) -> List[Dependency]:
+                # Parse requirement line (e.g., "requests>=2.25.0,<3.0.0"); blank lines,
+                # comments and options give no name
+                name, operator, version_spec = self._split_requirement_line(line)
+                if name:
+                    yield Dependency(
+                        name=name,
+                        version=version_spec,
+                        dependency_type=DependencyType.PYTHON,
+                        is_direct=True,
+                        # The operator is dropped from the version, so record whether
+                        # it is the exact installed version or only a bound
+                        metadata={"source": "requirements.txt", "pinned": operator in ("==", "===")}
+                    )
+
+    def _iter_pyproject_toml(self, repo_path: Path) -> Iterator[Dependency]:
         """Parse Python dependencies from pyproject.toml"""
-        dependencies = []
         pyproject_path = repo_path / "pyproject.toml"
 
-        with open(pyproject_path, 'r') as f:
-            pyproject_data = toml.load(f)
+        with open(pyproject_path, 'rb') as f:
+            pyproject_data = tomllib.load(f)
 
         # Check for poetry dependencies
         if "tool" in pyproject_data and "poetry" in pyproject_data["tool"]:
@@ -168,43 +494,39 @@ class DependencyService:
                         else:
                             version_spec = "*"
 
-                        dependencies.append(Dependency(
+                        yield Dependency(
                             name=name,
                             version=version_spec,
                             dependency_type=DependencyType.PYTHON,
                             is_direct=True,
                             metadata={"source": "pyproject.toml", "type": dep_type}
-                        ))
-
-        return dependencies
+                        )
 
     def _parse_requirement_line(self, line: str) -> tuple[str, str]:
-        """Parse a single requirement line from requirements.txt"""
-        # Remove comments
-        line = line.split('#')[0].strip()
-
-        # Handle different requirement formats
-        if '==' in line:
-            name, version = line.split('==', 1)
-        elif '>=' in line:
-            name, version = line.split('>=', 1)
-        elif '<=' in line:
-            name, version = line.split('<=', 1)
-        elif '!=' in line:
-            name, version = line.split('!=', 1)
-        elif '~=' in line:
-            name, version = line.split('~=', 1)
-        elif '=' in line:
-            name, version = line.split('=', 1)
-        else:
-            name, version = line, "*"
+        """
+        Parse a single requirement line from requirements.txt
 
-        return name.strip(), version.strip()
+        Returns an empty name for lines that are not package requirements.
+        """
+        name, _, version_spec = self._split_requirement_line(line)
+        return name, version_spec
+
+    def _split_requirement_line(self, line: str) -> Tuple[str, Optional[str], str]:
+        """Split a requirement line into its name, version operator and version spec"""
+        match = REQUIREMENT_PATTERN.match(line)
+        if not match:
+            return "", None, "*"
+
+        name, operator, version_spec = match.groups()
+        return name, operator, version_spec.rstrip() if version_spec else "*"
 
     def is_dependency_used(self, dependency: Dependency, repo_path: Path) -> bool:
         """
         Check if a dependency is actually used in the codebase
 
+        Matches imports the same way as scan_usage, which checks many dependencies
+        in one pass over the files.
+
         Args:
             dependency: The dependency to check
             repo_path: Path to the repository root
@@ -212,46 +534,76 @@ class DependencyService:
         Returns:
             True if the dependency appears to be used
         """
-        if dependency.dependency_type == DependencyType.NPM:
-            return self._is_npm_dependency_used(dependency, repo_path)
-        elif dependency.dependency_type == DependencyType.PYTHON:
-            return self._is_python_dependency_used(dependency, repo_path)
-
-        return True  # Default to True if we can't determine
-
-    def _is_npm_dependency_used(self, dependency: Dependency, repo_path: Path) -> bool:
-        """Check if an npm dependency is used in JavaScript/TypeScript files"""
-        # Common patterns for npm imports
-        import_patterns = [
-            rf"import.*['\"]{re.escape(dependency.name)}['\"]",
-            rf"require\(['\"]{re.escape(dependency.name)}['\"]\)",
-            rf"from ['\"]{re.escape(dependency.name)}['\"]"
-        ]
+        if dependency.dependency_type not in USAGE_EXTENSIONS:
+            return True  # Default to True for types we can't determine
+        return self.scan_usage([dependency], repo_path)[dependency.name]
+
+    def scan_usage(
+        self,
+        dependencies: List[Dependency],
+        repo_path: Path,
+        source_files: Optional[Sequence[str]] = None
+    ) -> Dict[str, bool]:
+        """
+        Check which dependencies are used in the codebase with a single pass over the files
 
-        return self._search_patterns_in_files(repo_path, import_patterns, ['.js', '.jsx', '.ts', '.tsx'])
+        Each source file is read and matched once against its ecosystem's import pattern,
+        regardless of how many dependencies there are. A dependency is used when its
+        package is imported, including through a submodule or subpath (``requests.adapters``,
+        ``lodash/fp``).
 
-    def _is_python_dependency_used(self, dependency: Dependency, repo_path: Path) -> bool:
-        """Check if a Python dependency is used in Python files"""
-        # Common patterns for Python imports
-        import_patterns = [
-            rf"import {re.escape(dependency.name)}",
-            rf"from {re.escape(dependency.name)} import",
-            rf"import {re.escape(dependency.name)} as",
-        ]
+        Args:
+            dependencies: The dependencies to check
+            repo_path: Path to the repository root
+            source_files: Files to scan, as listed by an earlier walk of the repository;
+                by default the repository is walked for them
+
+        Returns:
+            Dictionary mapping dependency names to whether they appear to be used
+        """
+        usage = {}
+        names_by_type: Dict[DependencyType, Dict[str, str]] = {}
+        for dep in dependencies:
+            names = names_by_type.get(dep.dependency_type)
+            if names is None:
+                names = names_by_type[dep.dependency_type] = {}
+            names[dep.name.lower()] = dep.name
+            usage[dep.name] = False
+
+        matchers = []
+        for dependency_type, names in names_by_type.items():
+            if dependency_type not in USAGE_EXTENSIONS:
+                for name in names.values():
+                    usage[name] = True
+                continue
+            matchers.append(UsageMatcher(
+                dependency_type,
+                USAGE_EXTENSIONS[dependency_type],
+                USAGE_KEYWORDS[dependency_type],
+                IMPORT_PATTERNS[dependency_type],
+                names
+            ))
+
+        if not matchers:
+            return usage  # Default to True for types we can't determine
+
+        if source_files is None:
+            extensions = tuple(sorted({ext for m in matchers for ext in m.extensions}))
+            source_files = _list_source_files(str(repo_path), extensions)
+        files = [file_path for file_path in source_files if not file_path.endswith(MINIFIED_SUFFIXES)]
+
+        if len(files) > PARALLEL_SCAN_MIN_FILES:
+            # Matching is CPU-bound and holds the GIL, so large repositories are split
+            # across processes
+            chunks = [files[i:i + PARALLEL_SCAN_CHUNK_SIZE] for i in range(0, len(files), PARALLEL_SCAN_CHUNK_SIZE)]
+            if self.scan_executor is not None:
+                for found in self.scan_executor.map(_scan_files_worker, chunks, itertools.repeat(matchers)):
+                    usage.update(found)
+            else:
+                with create_scan_executor() as pool:
+                    for found in pool.map(_scan_files_worker, chunks, itertools.repeat(matchers)):
+                        usage.update(found)
+        else:
+            _scan_files(files, matchers, usage)
 
-        return self._search_patterns_in_files(repo_path, import_patterns, ['.py'])
-
-    def _search_patterns_in_files(self, repo_path: Path, patterns: List[str], extensions: List[str]) -> bool:
-        """Search for patterns in files with specific extensions"""
-        for pattern in patterns:
-            for file_path in repo_path.rglob('*'):
-                if file_path.is_file() and file_path.suffix in extensions:
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            if re.search(pattern, content, re.IGNORECASE):
-                                return True
-                    except (UnicodeDecodeError, IOError):
-                        continue
-
-        return False
+        return usage
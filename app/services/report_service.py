@@ -0,0 +1,92 @@
+import sqlite3
+import threading
+import zlib
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+from ..models.analysis import AnalysisResponse
+
+
+class ReportService:
+    """Service for persisting analysis reports in SQLite"""
+
+    def __init__(self, db_path: str = "reports/minotaur.db"):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS reports (
+                    report_id TEXT PRIMARY KEY,
+                    repo_url TEXT NOT NULL,
+                    analysis_timestamp TEXT NOT NULL,
+                    vulnerabilities_found INTEGER NOT NULL,
+                    real_threats INTEGER NOT NULL,
+                    payload BLOB NOT NULL
+                )
+                """
+            )
+
+    def save(self, report: AnalysisResponse) -> None:
+        """
+        Store a report, replacing any existing report with the same ID
+
+        The full report is kept as compressed JSON; the summary fields are stored
+        as columns so listing reports never has to decode the payload.
+        """
+        payload = zlib.compress(report.model_dump_json().encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    report.report_id,
+                    report.repo_url,
+                    report.analysis_timestamp.isoformat(),
+                    report.vulnerabilities_found,
+                    report.real_threats,
+                    payload
+                )
+            )
+
+    def get(self, report_id: str) -> Optional[AnalysisResponse]:
+        """Retrieve a report by ID, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM reports WHERE report_id = ?", (report_id,)
+            ).fetchone()
+
+        if row is None:
+            return None
+        return AnalysisResponse.model_validate_json(zlib.decompress(row[0]))
+
+    def list_summaries(self) -> List[Dict[str, Any]]:
+        """List the summary fields of all stored reports"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT report_id, repo_url, analysis_timestamp, vulnerabilities_found, real_threats "
+                "FROM reports ORDER BY analysis_timestamp"
+            ).fetchall()
+
+        return [
+            {
+                "report_id": report_id,
+                "repo_url": repo_url,
+                "analysis_timestamp": analysis_timestamp,
+                "vulnerabilities_found": vulnerabilities_found,
+                "real_threats": real_threats
+            }
+            for report_id, repo_url, analysis_timestamp, vulnerabilities_found, real_threats in rows
+        ]
+
+    def delete(self, report_id: str) -> bool:
+        """Delete a report by ID, returning False if it did not exist"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute("DELETE FROM reports WHERE report_id = ?", (report_id,))
+        return cursor.rowcount > 0
+
+    def close(self):
+        """Close the underlying database connection"""
+        self._conn.close()
@@ -1,31 +1,48 @@
+import hashlib
 import os
 import tempfile
 import shutil
 import asyncio
 from pathlib import Path
-from typing import Optional
+from typing import Dict, List, Optional
 from urllib.parse import urlparse
 
-try:
-    import git
-    GIT_AVAILABLE = True
-except ImportError as e:
-    GIT_AVAILABLE = False
-    print(f"Warning: gitpython not available: {e}")
+GIT_AVAILABLE = shutil.which("git") is not None
+if not GIT_AVAILABLE:
+    print("Warning: git executable not found on PATH")
 
 from ..models.dependency import Dependency, DependencyType
+from .dependency_service import USAGE_EXTENSIONS
+
+# Only the files dependency analysis reads are checked out: the manifests at the
+# repository root and the source files scanned for imports
+SPARSE_CHECKOUT_PATTERNS = (
+    "/package.json",
+    "/package-lock.json",
+    "/requirements.txt",
+    "/pyproject.toml",
+    *sorted({f"*{extension}" for extensions in USAGE_EXTENSIONS.values() for extension in extensions})
+)
 
 
 class RepositoryService:
     """Service for cloning and managing GitHub repositories"""
 
-    def __init__(self, clone_timeout: int = 300):
+    def __init__(
+        self,
+        clone_timeout: int = 300,
+        clone_dir: Optional[str] = None,
+        mirror_dir: Optional[str] = None
+    ):
         self.clone_timeout = clone_timeout
+        self.clone_dir = clone_dir
+        self.mirror_dir = Path(mirror_dir).expanduser() if mirror_dir else None
         self.temp_dir = None
+        self._mirror_locks: Dict[Path, asyncio.Lock] = {}
 
         if not GIT_AVAILABLE:
             raise RuntimeError(
-                "GitPython is not available. Please ensure git is installed and GitPython is properly configured. "
+                "git is not available. Please ensure git is installed and on the PATH. "
                 "On Heroku, this requires the heroku-community/apt buildpack and an Aptfile containing 'git'."
             )
 
@@ -33,6 +50,10 @@ class RepositoryService:
         """
         Clone a GitHub repository to a temporary directory
 
+        The clone timeout is one deadline for the whole checkout, however many git
+        commands it takes. The directory is removed whenever the checkout does not
+        complete, including on cancellation.
+
         Args:
             repo_url: GitHub repository URL
 
@@ -41,37 +62,123 @@ class RepositoryService:
 
         Raises:
             ValueError: If URL is not a valid GitHub repository
-            git.GitCommandError: If cloning fails
+            TimeoutError: If cloning takes longer than the clone timeout
+            RuntimeError: If git fails to clone the repository
         """
-        if not self._is_valid_github_url(repo_url):
-            raise ValueError(f"Invalid GitHub URL: {repo_url}")
+        self.validate_repo_url(repo_url)
 
-        # Create temporary directory
-        self.temp_dir = tempfile.mkdtemp(prefix="minotaur_")
+        # Create temporary directory (clone_dir can point at a RAM-backed filesystem)
+        self.temp_dir = tempfile.mkdtemp(prefix="minotaur_", dir=self.clone_dir)
         repo_path = Path(self.temp_dir)
 
         try:
-            # Clone the repository with timeout
-            await asyncio.wait_for(
-                asyncio.to_thread(
-                    git.Repo.clone_from,
-                    repo_url,
-                    repo_path,
-                    depth=1  # Shallow clone for speed
-                ),
-                timeout=self.clone_timeout
-            )
-
+            async with asyncio.timeout(self.clone_timeout):
+                if self.mirror_dir:
+                    await self._checkout_from_mirror(repo_url, repo_path)
+                else:
+                    # Shallow, blobless, single-branch clone: no history and no file
+                    # contents are downloaded until the sparse checkout below
+                    await self._run_git(
+                        "clone", "--depth", "1", "--filter=blob:none", "--single-branch", "--no-checkout",
+                        repo_url, str(repo_path)
+                    )
+                    await self._sparse_checkout(repo_path)
             return repo_path
 
-        except asyncio.TimeoutError:
+        except TimeoutError:
             # Clean up on timeout
-            self.cleanup()
-            raise TimeoutError(f"Repository cloning timed out after {self.clone_timeout} seconds")
-        except git.GitCommandError as e:
-            # Clean up on failure
-            self.cleanup()
-            raise e
+            await asyncio.to_thread(self.cleanup, repo_path)
+            raise TimeoutError(f"Repository cloning timed out after {self.clone_timeout} seconds") from None
+        except Exception:
+            # Clean up on failure (git errors, but also e.g. OSError)
+            await asyncio.to_thread(self.cleanup, repo_path)
+            raise
+        except BaseException:
+            # Cancelled: clean up without awaiting, which could itself be interrupted
+            self.cleanup(repo_path)
+            raise
+
+    async def _checkout_from_mirror(self, repo_url: str, repo_path: Path):
+        """
+        Check out a repository from a persistent, blobless bare mirror
+
+        The mirror is created on first use and updated with ``git fetch`` afterwards, so
+        repeat analyses only transfer what changed upstream. The working tree is added
+        as a worktree of the mirror, sharing its object store.
+        """
+        mirror_path = self.mirror_dir / f"{hashlib.sha1(repo_url.encode()).hexdigest()}.git"
+        lock = self._mirror_locks.setdefault(mirror_path, asyncio.Lock())
+
+        async with lock:
+            if mirror_path.exists():
+                await self._run_git("-C", str(mirror_path), "fetch", "--prune", "--filter=blob:none")
+                # Forget worktrees of earlier analyses whose directories were removed
+                await self._run_git("-C", str(mirror_path), "worktree", "prune")
+            else:
+                self.mirror_dir.mkdir(parents=True, exist_ok=True)
+                await self._run_git("clone", "--mirror", "--filter=blob:none", repo_url, str(mirror_path))
+
+            await self._run_git(
+                "-C", str(mirror_path), "worktree", "add", "--detach", "--no-checkout", str(repo_path), "HEAD"
+            )
+            # Inside the lock: the first sparse checkout of a worktree updates the mirror's config
+            await self._sparse_checkout(repo_path)
+
+    async def _sparse_checkout(self, repo_path: Path):
+        """
+        Check out only the files matching SPARSE_CHECKOUT_PATTERNS
+
+        With a blobless clone, the contents of all other files are never downloaded.
+        """
+        await self._run_git("-C", str(repo_path), "sparse-checkout", "set", "--no-cone", *SPARSE_CHECKOUT_PATTERNS)
+        await self._run_git("-C", str(repo_path), "checkout")
+
+    async def list_files(self, repo_path: Path) -> List[str]:
+        """
+        List the paths of all files in the checked-out commit
+
+        The sparse checkout leaves most files out of the working tree, but the commit's
+        tree (which a blobless clone has) still lists every one of them. There is no
+        separate setting for this step: it gets the same budget as a whole clone
+        (``clone_timeout``, REPO_CLONE_TIMEOUT).
+
+        Raises:
+            RuntimeError: If git fails, or takes longer than the clone timeout
+        """
+        try:
+            async with asyncio.timeout(self.clone_timeout):
+                output = await self._run_git("-C", str(repo_path), "ls-tree", "-r", "-z", "--name-only", "HEAD")
+        except TimeoutError:
+            raise RuntimeError(f"Listing repository files timed out after {self.clone_timeout} seconds") from None
+        return [path.decode(errors="replace") for path in output.split(b"\0") if path]
+
+    async def _run_git(self, *args: str) -> bytes:
+        """
+        Run a git command and return its output, raising RuntimeError if it fails
+
+        Callers bound the time it may take; git is killed if the wait is interrupted.
+        """
+        process = await asyncio.create_subprocess_exec(
+            "git", *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env={**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        )
+        try:
+            stdout, stderr = await process.communicate()
+        except BaseException:
+            process.kill()
+            await process.wait()
+            raise
+
+        if process.returncode != 0:
+            raise RuntimeError(f"git {args[0]} failed: {stderr.decode(errors='replace').strip()}")
+        return stdout
+
+    def validate_repo_url(self, repo_url: str) -> None:
+        """Raise ValueError if the URL is not a valid GitHub repository URL"""
+        if not self._is_valid_github_url(repo_url):
+            raise ValueError(f"Invalid GitHub URL: {repo_url}")
 
     def _is_valid_github_url(self, url: str) -> bool:
         """Check if URL is a valid GitHub repository URL"""
@@ -93,10 +200,18 @@ class RepositoryService:
             return f"{path_parts[0]}/{path_parts[1]}"
         raise ValueError(f"Invalid GitHub URL: {repo_url}")
 
-    def cleanup(self):
-        """Clean up temporary repository directory"""
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+    def cleanup(self, repo_path: Optional[Path] = None):
+        """
+        Clean up a cloned repository directory
+
+        Args:
+            repo_path: Directory returned by clone_repository; defaults to the most
+                recent clone. Pass it explicitly when analyses run concurrently.
+        """
+        target = str(repo_path) if repo_path is not None else self.temp_dir
+        if target and os.path.exists(target):
+            shutil.rmtree(target)
+        if target == self.temp_dir:
             self.temp_dir = None
 
     def __enter__(self):
@@ -1,83 +1,206 @@
+import asyncio
+import functools
+import hashlib
 import os
-from typing import List, Dict, Any
-from langchain_openai import OpenAI
-from langchain.prompts import PromptTemplate
-from langchain.output_parsers import PydanticOutputParser
-import json
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+import orjson
+from openai import AsyncOpenAI
 
 from ..models.dependency import Dependency
 from ..models.vulnerability import Vulnerability, ThreatLevel
 from ..models.analysis import TriageResult
+from .cache_service import CacheService
+from config.settings import supports_structured_outputs
 
+# Completion token budget per vulnerability when triaging a group in one prompt
+GROUP_TOKENS_PER_RESULT = 400
 
-class TriageService:
-    """Service for LLM-based vulnerability triage"""
-
-    def __init__(self, openai_api_key: str = None):
-        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-        if not self.openai_api_key:
-            raise ValueError("OpenAI API key is required for triage service")
-
-        self.llm = OpenAI(
-            api_key=self.openai_api_key,
-            temperature=0.1,  # Low temperature for consistent results
-            max_tokens=1000
-        )
+SYSTEM_PROMPT = """You are a cybersecurity expert analyzing a vulnerability in a software dependency. Your task is to determine if this vulnerability represents a real threat in the specific context provided.
 
-        # Create the prompt template
-        self.prompt_template = PromptTemplate(
-            input_variables=[
-                "vulnerability_id",
-                "vulnerability_summary",
-                "vulnerability_description",
-                "dependency_name",
-                "dependency_version",
-                "dependency_type",
-                "is_direct_dependency",
-                "is_dependency_used",
-                "repo_context"
-            ],
-            template="""
-You are a cybersecurity expert analyzing a vulnerability in a software dependency. Your task is to determine if this vulnerability represents a real threat in the specific context provided.
+The user message is a JSON object describing the vulnerability, the affected dependency and the repository. Analyze whether the vulnerability represents a real threat in this specific context. Consider:
 
-Vulnerability Information:
-- ID: {vulnerability_id}
-- Summary: {vulnerability_summary}
-- Description: {vulnerability_description}
+1. Whether the vulnerability is actually exploitable given how the dependency is used
+2. The severity and impact of the vulnerability
+3. Whether the dependency is actually imported/used in the codebase
+4. The specific context of the repository (type of application, etc.)
 
-Dependency Information:
-- Name: {dependency_name}
-- Version: {dependency_version}
-- Type: {dependency_type}
-- Is Direct Dependency: {is_direct_dependency}
-- Is Dependency Used in Code: {is_dependency_used}
+Give your confidence in the assessment between 0.0 and 1.0, and a detailed explanation of your reasoning."""
 
-Repository Context:
-{repo_context}
+# System prompt for triaging a group of vulnerabilities in a single request, so the
+# repository context is only sent once per group
+GROUP_SYSTEM_PROMPT = """You are a cybersecurity expert analyzing vulnerabilities in the dependencies of a software project. Your task is to determine, for each vulnerability, if it represents a real threat in the specific context provided.
 
-Based on this information, analyze whether this vulnerability represents a real threat in this specific context. Consider:
+The user message is a JSON object with the repository context and a numbered list of vulnerabilities, each with its affected dependency. For each vulnerability, analyze whether it represents a real threat in this specific context. Consider:
 
 1. Whether the vulnerability is actually exploitable given how the dependency is used
 2. The severity and impact of the vulnerability
 3. Whether the dependency is actually imported/used in the codebase
 4. The specific context of the repository (type of application, etc.)
 
-Provide your analysis in the following JSON format:
-{{
-    "is_real_threat": true/false,
-    "threat_level": "critical/high/medium/low/info",
-    "impact_summary": "Brief summary of potential impact",
-    "recommendation": "Specific action to take",
-    "confidence": 0.0-1.0,
-    "reasoning": "Detailed explanation of your assessment"
-}}
-
-Analysis:
-"""
-        )
+Return exactly one result per vulnerability, in the same order and with the same index. Give your confidence in each assessment between 0.0 and 1.0, and keep each reasoning to a few sentences."""
+
+
+def _strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Adapt a pydantic JSON schema to OpenAI's strict structured output mode
+
+    Strict mode requires every property to be required and no additional properties,
+    and does not accept titles or defaults.
+    """
+    schema = {key: value for key, value in schema.items() if key not in ("title", "default")}
+    if "properties" in schema:
+        schema["properties"] = {name: _strict_schema(value) for name, value in schema["properties"].items()}
+        schema["required"] = list(schema["properties"])
+        schema["additionalProperties"] = False
+    if "items" in schema:
+        schema["items"] = _strict_schema(schema["items"])
+    if "$defs" in schema:
+        schema["$defs"] = {name: _strict_schema(value) for name, value in schema["$defs"].items()}
+    return schema
+
+
+TRIAGE_SCHEMA = _strict_schema(TriageResult.model_json_schema())
+
+GROUP_TRIAGE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "results": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"index": {"type": "integer"}, **TRIAGE_SCHEMA["properties"]},
+                "required": ["index", *TRIAGE_SCHEMA["required"]],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["results"],
+    "additionalProperties": False,
+    "$defs": TRIAGE_SCHEMA.get("$defs", {})
+}
+
+
+def _response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured output format forcing the model to emit a schema-valid object"""
+    return {"type": "json_schema", "json_schema": {"name": name, "strict": True, "schema": schema}}
+
+
+TRIAGE_RESPONSE_FORMAT = _response_format("triage_result", TRIAGE_SCHEMA)
+GROUP_TRIAGE_RESPONSE_FORMAT = _response_format("group_triage_result", GROUP_TRIAGE_SCHEMA)
+
+
+@functools.lru_cache(maxsize=8)
+def _context_digest(repo_context: str) -> str:
+    """Hash the repository context once per analysis rather than once per vulnerability"""
+    return hashlib.blake2b(repo_context.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def fallback_triage(
+    vulnerability: Vulnerability,
+    dependency: Dependency,
+    is_dependency_used: bool
+) -> TriageResult:
+    """
+    Rule-based triage, used when LLM analysis fails
+
+    Args:
+        vulnerability: The vulnerability to analyze
+        dependency: The affected dependency
+        is_dependency_used: Whether the dependency is actually used
+
+    Returns:
+        TriageResult with basic analysis
+    """
+    # Simple rule-based triage
+    is_real_threat = is_dependency_used and dependency.is_direct
+
+    # Determine threat level based on severity
+    severity = vulnerability.severity or "unknown"
+    if severity.lower() in ["critical", "high"]:
+        threat_level = ThreatLevel.HIGH if is_real_threat else ThreatLevel.MEDIUM
+    elif severity.lower() == "medium":
+        threat_level = ThreatLevel.MEDIUM if is_real_threat else ThreatLevel.LOW
+    else:
+        threat_level = ThreatLevel.LOW
+
+    impact_summary = f"Vulnerability in {dependency.name} {dependency.version}"
+    if is_real_threat:
+        recommendation = f"Update {dependency.name} to a patched version"
+    else:
+        recommendation = "Monitor for updates but no immediate action required"
+
+    return TriageResult(
+        is_real_threat=is_real_threat,
+        threat_level=threat_level,
+        impact_summary=impact_summary,
+        recommendation=recommendation,
+        confidence=0.5,  # Lower confidence for fallback
+        reasoning="Fallback analysis used due to LLM processing error"
+    )
 
-        # Create output parser
-        self.output_parser = PydanticOutputParser(pydantic_object=TriageResult)
+
+class TriageService:
+    """Service for LLM-based vulnerability triage"""
+
+    def __init__(
+        self,
+        openai_api_key: str = None,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0.1,
+        max_tokens: int = 1000,
+        max_concurrent_requests: int = 8,
+        cache: Optional[CacheService] = None,
+        cache_ttl: int = 7 * 86400,
+        max_retries: int = 5,
+        memory_cache_size: int = 10_000
+    ):
+        self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
+        if not self.openai_api_key:
+            raise ValueError("OpenAI API key is required for triage service")
+        if not supports_structured_outputs(model):
+            raise ValueError(f"Model {model} does not support structured outputs, which triage requires")
+
+        # Rate limited (429) and transient server errors are retried by the client with
+        # exponential backoff, honouring any Retry-After header, before a request
+        # falls back to rule-based triage
+        self.client = AsyncOpenAI(api_key=self.openai_api_key, max_retries=max_retries)
+        self.model = model
+        self.temperature = temperature  # Keep low for consistent results
+        self.max_tokens = max_tokens
+        self.max_concurrent_requests = max_concurrent_requests
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # Most recently used verdicts, in front of the persistent cache; also the only
+        # cache when none is configured
+        self.memory_cache_size = memory_cache_size
+        self._memory_cache: "OrderedDict[str, TriageResult]" = OrderedDict()
+
+    async def _complete(
+        self,
+        system_prompt: str,
+        user_content: Dict[str, Any],
+        response_format: Dict[str, Any],
+        max_tokens: int
+    ) -> str:
+        """
+        Ask the chat model for a structured response and return the response text
+
+        The instructions are a fixed system prompt; only the variable fields are sent,
+        as a compact JSON user message.
+        """
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": orjson.dumps(user_content).decode("utf-8")}
+            ],
+            temperature=self.temperature,
+            max_tokens=max_tokens,
+            response_format=response_format
+        )
+        return response.choices[0].message.content or ""
 
     async def triage_vulnerability(
         self,
@@ -98,95 +221,203 @@ Analysis:
         Returns:
             TriageResult with the analysis
         """
+        cache_key = self._cache_key(vulnerability, dependency, repo_context, is_dependency_used)
+        cached = (await self._get_cached([cache_key]))[0]
+        if cached is not None:
+            return cached
+
         try:
-            # Prepare the prompt
-            prompt = self.prompt_template.format(
-                vulnerability_id=vulnerability.id,
-                vulnerability_summary=vulnerability.summary,
-                vulnerability_description=vulnerability.description or "No description available",
-                dependency_name=dependency.name,
-                dependency_version=dependency.version,
-                dependency_type=dependency.dependency_type,
-                is_direct_dependency=dependency.is_direct,
-                is_dependency_used=is_dependency_used,
-                repo_context=repo_context
+            # Get LLM response (structured output guarantees a schema-valid object,
+            # anything else such as a refusal fails validation)
+            user_content = self._describe(vulnerability, dependency, is_dependency_used)
+            user_content["repo_context"] = repo_context
+            response_text = await self._complete(
+                SYSTEM_PROMPT, user_content, TRIAGE_RESPONSE_FORMAT, self.max_tokens
             )
+            result = TriageResult.model_validate_json(response_text)
+        except Exception as e:
+            print(f"Error in LLM triage for {vulnerability.id}: {e}")
+            return self._fallback_triage(vulnerability, dependency, is_dependency_used)
 
-            # Get LLM response
-            response = await self.llm.agenerate([prompt])
-            response_text = response.generations[0][0].text.strip()
+        await self._store_cached({cache_key: result})
+        return result
 
-            # Parse the response
-            try:
-                # Try to extract JSON from the response
-                json_start = response_text.find('{')
-                json_end = response_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_str = response_text[json_start:json_end]
-                    triage_data = json.loads(json_str)
-
-                    return TriageResult(
-                        is_real_threat=triage_data["is_real_threat"],
-                        threat_level=ThreatLevel(triage_data["threat_level"]),
-                        impact_summary=triage_data["impact_summary"],
-                        recommendation=triage_data["recommendation"],
-                        confidence=triage_data["confidence"],
-                        reasoning=triage_data["reasoning"]
-                    )
-                else:
-                    raise ValueError("No JSON found in response")
-
-            except (json.JSONDecodeError, KeyError, ValueError) as e:
-                # Fallback to default triage if parsing fails
-                return self._fallback_triage(vulnerability, dependency, is_dependency_used)
+    async def triage_batch(
+        self,
+        items: List[Tuple[Vulnerability, Dependency, bool]],
+        repo_context: str
+    ) -> List[TriageResult]:
+        """
+        Triage a group of vulnerabilities with a single LLM request
+
+        Args:
+            items: (vulnerability, affected dependency, is dependency used) tuples
+            repo_context: Context about the repository
+
+        Returns:
+            One TriageResult per item, in the same order. Items the response does not
+            cover are given a fallback triage.
+        """
+        keys = [
+            self._cache_key(vulnerability, dependency, repo_context, is_dependency_used)
+            for vulnerability, dependency, is_dependency_used in items
+        ]
+        triage_results = await self._get_cached(keys)
+        pending = [i for i, result in enumerate(triage_results) if result is None]
+
+        if len(pending) == 1:
+            vulnerability, dependency, is_dependency_used = items[pending[0]]
+            triage_results[pending[0]] = await self.triage_vulnerability(
+                vulnerability, dependency, repo_context, is_dependency_used
+            )
+        elif pending:
+            triage_results = await self._triage_group(items, keys, pending, triage_results, repo_context)
+
+        return triage_results
 
+    async def _triage_group(
+        self,
+        items: List[Tuple[Vulnerability, Dependency, bool]],
+        keys: List[str],
+        pending: List[int],
+        triage_results: List[Optional[TriageResult]],
+        repo_context: str
+    ) -> List[TriageResult]:
+        """Triage the pending items of a group with one LLM request, caching the results"""
+        user_content = {
+            "repo_context": repo_context,
+            "vulnerabilities": [
+                {"index": index, **self._describe(*items[position])}
+                for index, position in enumerate(pending, start=1)
+            ]
+        }
+
+        triage_data = {}
+        try:
+            response_text = await self._complete(
+                GROUP_SYSTEM_PROMPT,
+                user_content,
+                GROUP_TRIAGE_RESPONSE_FORMAT,
+                GROUP_TOKENS_PER_RESULT * len(pending)
+            )
+            results = orjson.loads(response_text).get("results", [])
+            for number, data in enumerate(results, start=1):
+                if isinstance(data, dict):
+                    triage_data[data.get("index", number)] = data
         except Exception as e:
-            print(f"Error in LLM triage for {vulnerability.id}: {e}")
-            return self._fallback_triage(vulnerability, dependency, is_dependency_used)
+            print(f"Error in LLM group triage: {e}")
 
-    def _fallback_triage(
+        fresh = {}
+        for index, position in enumerate(pending, start=1):
+            vulnerability, dependency, is_dependency_used = items[position]
+            try:
+                triage_results[position] = fresh[keys[position]] = TriageResult.model_validate(triage_data[index])
+            except (KeyError, ValueError):
+                triage_results[position] = self._fallback_triage(vulnerability, dependency, is_dependency_used)
+
+        await self._store_cached(fresh)
+        return triage_results
+
+    def _describe(
         self,
         vulnerability: Vulnerability,
         dependency: Dependency,
         is_dependency_used: bool
-    ) -> TriageResult:
+    ) -> Dict[str, Any]:
+        """The per-vulnerability fields sent to the LLM"""
+        return {
+            "vulnerability": {
+                "id": vulnerability.id,
+                "summary": vulnerability.summary,
+                "description": vulnerability.description or "No description available"
+            },
+            "dependency": {
+                "name": dependency.name,
+                "version": dependency.version,
+                "type": dependency.dependency_type.value,
+                "is_direct_dependency": dependency.is_direct,
+                "is_used_in_code": is_dependency_used
+            }
+        }
+
+    def _cache_key(
+        self,
+        vulnerability: Vulnerability,
+        dependency: Dependency,
+        repo_context: str,
+        is_dependency_used: bool
+    ) -> str:
+        """Content hash of everything a triage verdict depends on"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in (
+            self.model,
+            vulnerability.id,
+            str(vulnerability.modified),
+            dependency.dependency_type.value,
+            dependency.name,
+            dependency.version,
+            str(dependency.is_direct),
+            str(is_dependency_used),
+            _context_digest(repo_context)
+        ):
+            digest.update(part.encode("utf-8") + b"\0")
+        return f"triage:{digest.hexdigest()}"
+
+    async def _get_cached(self, keys: List[str]) -> List[Optional[TriageResult]]:
         """
-        Fallback triage logic when LLM analysis fails
+        Look up cached triage results, in memory first, with None for each miss
 
-        Args:
-            vulnerability: The vulnerability to analyze
-            dependency: The affected dependency
-            is_dependency_used: Whether the dependency is actually used
-
-        Returns:
-            TriageResult with basic analysis
+        Misses are loaded from the persistent cache in a worker thread, off the event loop.
         """
-        # Simple rule-based triage
-        is_real_threat = is_dependency_used and dependency.is_direct
-
-        # Determine threat level based on severity
-        severity = vulnerability.severity or "unknown"
-        if severity.lower() in ["critical", "high"]:
-            threat_level = ThreatLevel.HIGH if is_real_threat else ThreatLevel.MEDIUM
-        elif severity.lower() == "medium":
-            threat_level = ThreatLevel.MEDIUM if is_real_threat else ThreatLevel.LOW
-        else:
-            threat_level = ThreatLevel.LOW
-
-        impact_summary = f"Vulnerability in {dependency.name} {dependency.version}"
-        if is_real_threat:
-            recommendation = f"Update {dependency.name} to a patched version"
-        else:
-            recommendation = "Monitor for updates but no immediate action required"
-
-        return TriageResult(
-            is_real_threat=is_real_threat,
-            threat_level=threat_level,
-            impact_summary=impact_summary,
-            recommendation=recommendation,
-            confidence=0.5,  # Lower confidence for fallback
-            reasoning="Fallback analysis used due to LLM processing error"
-        )
+        results = [self._memory_cache.get(key) for key in keys]
+        for key, result in zip(keys, results):
+            if result is not None:
+                self._memory_cache.move_to_end(key)
+
+        missing = [key for key, result in zip(keys, results) if result is None]
+        if not self.cache or not missing:
+            return results
+
+        loaded = await asyncio.to_thread(self._load_cached, missing)
+        for i, key in enumerate(keys):
+            if results[i] is None and key in loaded:
+                results[i] = loaded[key]
+        self._remember(loaded)
+        return results
+
+    def _load_cached(self, keys: List[str]) -> Dict[str, TriageResult]:
+        """Read and parse triage results from the persistent cache (blocking)"""
+        cached = self.cache.get_many(keys)
+        return {key: TriageResult.model_validate_json(value) for key, value in cached.items()}
+
+    async def _store_cached(self, results: Dict[str, TriageResult]) -> None:
+        """Cache triage results produced by the LLM (fallback verdicts are never cached)"""
+        if not results:
+            return
+        self._remember(results)
+        if self.cache:
+            await asyncio.to_thread(
+                self.cache.set_many,
+                {key: result.model_dump_json() for key, result in results.items()},
+                self.cache_ttl
+            )
+
+    def _remember(self, results: Dict[str, TriageResult]) -> None:
+        """Add results to the in-memory cache, evicting the least recently used"""
+        for key, result in results.items():
+            self._memory_cache[key] = result
+            self._memory_cache.move_to_end(key)
+        while len(self._memory_cache) > self.memory_cache_size:
+            self._memory_cache.popitem(last=False)
+
+    def _fallback_triage(
+        self,
+        vulnerability: Vulnerability,
+        dependency: Dependency,
+        is_dependency_used: bool
+    ) -> TriageResult:
+        """Fallback triage logic when LLM analysis fails"""
+        return fallback_triage(vulnerability, dependency, is_dependency_used)
 
     async def triage_vulnerabilities_batch(
         self,
@@ -198,6 +429,8 @@ Analysis:
         """
         Triage multiple vulnerabilities in parallel
 
+        At most ``max_concurrent_requests`` LLM requests are in flight at a time.
+
         Args:
             vulnerabilities: List of vulnerabilities to analyze
             dependencies: List of affected dependencies
@@ -210,34 +443,35 @@ Analysis:
         # Create a mapping of dependency names to dependency objects
         dep_map = {dep.name: dep for dep in dependencies}
 
-        # Process vulnerabilities in parallel
-        tasks = []
+        plan = []
         for vuln in vulnerabilities:
             # Find the corresponding dependency
-            dep_name = None
-            for affected in vuln.affected_packages:
-                if affected.get("name") in dep_map:
-                    dep_name = affected.get("name")
-                    break
-
-            if dep_name and dep_name in dep_map:
-                task = self.triage_vulnerability(
-                    vuln,
-                    dep_map[dep_name],
-                    repo_context,
-                    dependency_usage.get(dep_name, True)
-                )
-                tasks.append(task)
-
-        # Execute all triage tasks
-        results = []
-        for task in tasks:
-            try:
-                result = await task
-                results.append(result)
-            except Exception as e:
-                print(f"Error in batch triage: {e}")
+            dep_name = next(
+                (affected.get("name") for affected in vuln.affected_packages if affected.get("name") in dep_map),
+                None
+            )
+
+            if dep_name:
+                plan.append((vuln, dep_map[dep_name], dependency_usage.get(dep_name, True)))
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        async def guarded(vuln: Vulnerability, dep: Dependency, is_used: bool) -> TriageResult:
+            async with semaphore:
+                return await self.triage_vulnerability(vuln, dep, repo_context, is_used)
+
+        # Execute all triage tasks concurrently
+        results = await asyncio.gather(
+            *(guarded(vuln, dep, is_used) for vuln, dep, is_used in plan),
+            return_exceptions=True
+        )
+
+        triage_results = []
+        for (vuln, dep, is_used), result in zip(plan, results):
+            if isinstance(result, Exception):
+                print(f"Error in batch triage: {result}")
                 # Add a fallback result
-                results.append(self._fallback_triage(vuln, dep_map[dep_name], True))
+                result = self._fallback_triage(vuln, dep, is_used)
+            triage_results.append(result)
 
-        return results
+        return triage_results
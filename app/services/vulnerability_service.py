@@ -1,26 +1,50 @@
 import asyncio
 import aiohttp
-from typing import List, Dict, Any, Optional
+import re
+from typing import List, Dict, Any, Optional, Set, Tuple
 from datetime import datetime
 import json
 
-from ..models.dependency import Dependency
+from packaging.version import InvalidVersion, Version
+
+from ..models.dependency import Dependency, DependencyType
 from ..models.vulnerability import Vulnerability
+from .cache_service import CacheService
+
+# An exact npm (semver) version, as resolved by package-lock.json
+NPM_EXACT_VERSION = re.compile(r"\d+\.\d+\.\d+(?:-[0-9A-Za-z.-]+)?(?:\+[0-9A-Za-z.-]+)?")
 
 
 class VulnerabilityService:
     """Service for querying vulnerability databases"""
 
-    def __init__(self, osv_api_url: str = "https://api.osv.dev"):
+    def __init__(
+        self,
+        osv_api_url: str = "https://api.osv.dev",
+        max_concurrent_requests: int = 20,
+        cache: Optional[CacheService] = None,
+        cache_ttl: int = 86400,
+        session: Optional[aiohttp.ClientSession] = None,
+        batch_size: int = 128,
+        max_concurrent_batches: int = 8
+    ):
         self.osv_api_url = osv_api_url.rstrip('/')
-        self.session = None
+        self.max_concurrent_requests = max_concurrent_requests
+        self.batch_size = batch_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+        # A session passed in is shared (e.g. process-wide) and left open on exit
+        self.session = session
+        self._owns_session = session is None
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
+        if self._owns_session:
+            self.session = aiohttp.ClientSession()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session:
+        if self._owns_session and self.session:
             await self.session.close()
 
     async def get_vulnerabilities_for_dependency(self, dependency: Dependency) -> List[Vulnerability]:
@@ -36,15 +60,8 @@ class VulnerabilityService:
         if not self.session:
             raise RuntimeError("VulnerabilityService must be used as async context manager")
 
-        query = {
-            "package": {
-                "name": dependency.name,
-                "ecosystem": self._get_ecosystem(dependency.dependency_type)
-            }
-        }
-
         try:
-            data = await self._make_api_request(query)
+            data = await self._make_api_request(self._build_query(dependency))
             return [self._parse_vulnerability(vuln) for vuln in data.get("vulns", [])]
         except Exception as e:
             print(f"Exception querying OSV API for {dependency.name}: {e}")
@@ -64,36 +81,207 @@ class VulnerabilityService:
                 print(f"Error querying OSV API: {response.status}")
                 return {"vulns": []}
 
-    async def get_vulnerabilities_batch(self, dependencies: List[Dependency]) -> Dict[str, List[Vulnerability]]:
+    async def _make_batch_request(self, queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Make a batch query request to OSV.dev, returning vulnerability IDs per query"""
+        async with self.session.post(
+            f"{self.osv_api_url}/v1/querybatch",
+            json={"queries": queries},
+            headers={"Content-Type": "application/json"}
+        ) as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                print(f"Error querying OSV batch API: {response.status}")
+                return {"results": []}
+
+    async def _fetch_vulnerability_data(self, vuln_id: str) -> Optional[Dict[str, Any]]:
+        """Fetch the full record of a single vulnerability from OSV.dev"""
+        async with self.session.get(f"{self.osv_api_url}/v1/vulns/{vuln_id}") as response:
+            if response.status == 200:
+                return await response.json()
+            else:
+                print(f"Error fetching vulnerability {vuln_id}: {response.status}")
+                return None
+
+    async def get_vulnerabilities_batch(
+        self,
+        dependencies: List[Dependency]
+    ) -> Dict[Tuple[DependencyType, str, str], List[Vulnerability]]:
         """
-        Get vulnerabilities for multiple dependencies in parallel
+        Get vulnerabilities for multiple dependencies
+
+        Dependencies are queried with OSV batch requests of up to ``batch_size`` queries,
+        sent concurrently; these only return vulnerability IDs. Each unique ID is then
+        hydrated once, concurrently, even when it affects several dependencies. When a
+        cache is configured, per-dependency query results and vulnerability records are
+        reused until they expire, and a cached record is refetched whenever OSV reports
+        a newer modification time for it. Cache reads and writes run in worker threads,
+        off the event loop.
 
         Args:
             dependencies: List of dependencies to check
 
         Returns:
-            Dictionary mapping dependency names to their vulnerabilities
+            Dictionary mapping each dependency's version_key to its vulnerabilities, so
+            that e.g. an npm and a PyPI package of the same name, or two versions of
+            one package, are kept apart
         """
         if not self.session:
             raise RuntimeError("VulnerabilityService must be used as async context manager")
 
-        # Create tasks for parallel execution
-        tasks = []
-        for dep in dependencies:
-            task = self.get_vulnerabilities_for_dependency(dep)
-            tasks.append((dep.name, task))
+        results = {dep.version_key: [] for dep in dependencies}
+        if not dependencies:
+            return results
+
+        stubs_by_dependency = {}
+        pending = dependencies
+        if self.cache:
+            cached_queries = await asyncio.to_thread(
+                self.cache.get_many, [self._query_cache_key(dep) for dep in dependencies]
+            )
+            pending = []
+            for dep in dependencies:
+                cached = cached_queries.get(self._query_cache_key(dep))
+                if cached is None:
+                    pending.append(dep)
+                else:
+                    stubs_by_dependency[dep.version_key] = json.loads(cached)
+
+        if pending:
+            chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            semaphore = asyncio.Semaphore(self.max_concurrent_batches)
+            chunk_results = await asyncio.gather(
+                *(self._query_batch_chunk(semaphore, chunk) for chunk in chunks)
+            )
+
+            fresh_queries = {}
+            for chunk, batch_results in zip(chunks, chunk_results):
+                for dep, result in zip(chunk, batch_results):
+                    stubs = [
+                        {"id": vuln["id"], "modified": vuln.get("modified")}
+                        for vuln in result.get("vulns", [])
+                    ]
+                    stubs_by_dependency[dep.version_key] = stubs
+                    fresh_queries[self._query_cache_key(dep)] = json.dumps(stubs)
+
+            if self.cache:
+                await asyncio.to_thread(self.cache.set_many, fresh_queries, self.cache_ttl)
+
+        modified_by_id = {
+            stub["id"]: stub["modified"]
+            for stubs in stubs_by_dependency.values()
+            for stub in stubs
+        }
+        vulnerabilities = (
+            await asyncio.to_thread(self._get_cached_vulnerabilities, modified_by_id) if self.cache else {}
+        )
+        fetched = await self._fetch_vulnerabilities(set(modified_by_id) - set(vulnerabilities))
+        if self.cache:
+            await asyncio.to_thread(
+                self.cache.set_many,
+                {self._vulnerability_cache_key(vuln_id): vuln.model_dump_json() for vuln_id, vuln in fetched.items()},
+                self.cache_ttl
+            )
+        vulnerabilities.update(fetched)
+
+        for key, stubs in stubs_by_dependency.items():
+            results[key] = [vulnerabilities[stub["id"]] for stub in stubs if stub["id"] in vulnerabilities]
+
+        return results
+
+    async def _query_batch_chunk(
+        self,
+        semaphore: asyncio.Semaphore,
+        dependencies: List[Dependency]
+    ) -> List[Dict[str, Any]]:
+        """Query OSV for one chunk of dependencies; a failed chunk yields no results"""
+        queries = [self._build_query(dep) for dep in dependencies]
 
-        # Execute all queries in parallel
-        results = {}
-        for dep_name, task in tasks:
+        async with semaphore:
             try:
-                vulnerabilities = await task
-                results[dep_name] = vulnerabilities
+                batch_data = await self._make_batch_request(queries)
             except Exception as e:
-                print(f"Error getting vulnerabilities for {dep_name}: {e}")
-                results[dep_name] = []
+                print(f"Exception querying OSV batch API: {e}")
+                return []
 
-        return results
+        return batch_data.get("results", [])
+
+    def _build_query(self, dependency: Dependency) -> Dict[str, Any]:
+        """
+        Build the OSV query for a dependency
+
+        Exact versions are included so OSV only returns the vulnerabilities affecting
+        that version, rather than every vulnerability of the package (most of which
+        would then be fetched and triaged for nothing). Ranges such as "^4.17.1" are
+        not accepted by OSV and query the whole package.
+        """
+        query: Dict[str, Any] = {
+            "package": {
+                "name": dependency.name,
+                "ecosystem": self._get_ecosystem(dependency.dependency_type)
+            }
+        }
+        if self._is_exact_version(dependency):
+            query["version"] = dependency.version
+        return query
+
+    def _is_exact_version(self, dependency: Dependency) -> bool:
+        """Whether a dependency's version is a single exact version, not a range"""
+        if dependency.dependency_type == DependencyType.NPM:
+            return NPM_EXACT_VERSION.fullmatch(dependency.version) is not None
+        if dependency.metadata.get("pinned") is False:
+            return False  # e.g. "requests>=2.25.0", whose version reads "2.25.0"
+        try:
+            Version(dependency.version)
+        except InvalidVersion:
+            return False
+        return True
+
+    def _get_cached_vulnerabilities(self, modified_by_id: Dict[str, Optional[str]]) -> Dict[str, Vulnerability]:
+        """Load cached vulnerability records that are at least as recent as OSV reports"""
+        cached = self.cache.get_many(self._vulnerability_cache_key(vuln_id) for vuln_id in modified_by_id)
+
+        vulnerabilities = {}
+        for vuln_id, modified in modified_by_id.items():
+            value = cached.get(self._vulnerability_cache_key(vuln_id))
+            if value is None:
+                continue
+
+            vuln = Vulnerability.model_validate_json(value)
+            latest = self._parse_timestamp(modified)
+            if latest and (vuln.modified is None or vuln.modified < latest):
+                continue  # Updated upstream since it was cached
+
+            vulnerabilities[vuln_id] = vuln
+        return vulnerabilities
+
+    def _query_cache_key(self, dependency: Dependency) -> str:
+        """Cache key of the OSV query result for a dependency"""
+        return f"osv:query:{dependency.dependency_type.value}:{dependency.name}:{dependency.version}"
+
+    def _vulnerability_cache_key(self, vuln_id: str) -> str:
+        """Cache key of a full OSV vulnerability record"""
+        return f"osv:vuln:{vuln_id}"
+
+    async def _fetch_vulnerabilities(self, vuln_ids: Set[str]) -> Dict[str, Vulnerability]:
+        """Fetch and parse full vulnerability records concurrently, with bounded concurrency"""
+        semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+
+        async def fetch(vuln_id: str) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                try:
+                    return await self._fetch_vulnerability_data(vuln_id)
+                except Exception as e:
+                    print(f"Exception fetching vulnerability {vuln_id}: {e}")
+                    return None
+
+        ids = list(vuln_ids)
+        records = await asyncio.gather(*(fetch(vuln_id) for vuln_id in ids))
+        return {
+            vuln_id: self._parse_vulnerability(record)
+            for vuln_id, record in zip(ids, records)
+            if record is not None
+        }
 
     def _get_ecosystem(self, dependency_type: str) -> str:
         """Map dependency type to OSV ecosystem name"""
@@ -124,19 +312,8 @@ class VulnerabilityService:
             })
 
         # Parse dates
-        published = None
-        if vuln_data.get("published"):
-            try:
-                published = datetime.fromisoformat(vuln_data["published"].replace("Z", "+00:00"))
-            except ValueError:
-                pass
-
-        modified = None
-        if vuln_data.get("modified"):
-            try:
-                modified = datetime.fromisoformat(vuln_data["modified"].replace("Z", "+00:00"))
-            except ValueError:
-                pass
+        published = self._parse_timestamp(vuln_data.get("published"))
+        modified = self._parse_timestamp(vuln_data.get("modified"))
 
         return Vulnerability(
             id=vuln_data.get("id", ""),
@@ -150,6 +327,15 @@ class VulnerabilityService:
             database_specific=vuln_data.get("database_specific", {})
         )
 
+    def _parse_timestamp(self, value: Optional[str]) -> Optional[datetime]:
+        """Parse an RFC 3339 timestamp from the OSV API, returning None if missing or invalid"""
+        if not value:
+            return None
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+
     def is_vulnerability_affecting_version(self, vulnerability: Vulnerability, dependency: Dependency) -> bool:
         """
         Check if a vulnerability affects the specific version of a dependency
@@ -4,25 +4,25 @@ Minotaur CLI - Command line interface for dependency threat analysis
 """
 
 import asyncio
-import json
+import importlib.util
 import sys
 import argparse
 from pathlib import Path
 from typing import Optional
-from dotenv import load_dotenv
+from dotenv import dotenv_values
+
+from config.settings import get_settings, load_env_file, validate_settings
 
 # Load environment variables from .env file
-load_dotenv()
+load_env_file()
 
-from app.core.analysis_engine import AnalysisEngine
 from app.models.analysis import AnalysisRequest
-from config.settings import settings
 
 
 def print_report(report, output_format: str = "json"):
     """Print analysis report in specified format"""
     if output_format == "json":
-        print(json.dumps(report.dict(), indent=2, default=str))
+        print(report.model_dump_json(indent=2))
     elif output_format == "summary":
         print(f"\n=== Minotaur Analysis Report ===")
         print(f"Repository: {report.repo_url}")
@@ -64,27 +64,23 @@ def check_configuration():
     if env_file.exists():
         print("✅ .env file found")
 
-        with open(env_file, 'r') as f:
-            content = f.read()
-
-        if "OPENAI_API_KEY=" in content and "your-openai-api-key-here" not in content:
+        api_key = dotenv_values(env_file).get("OPENAI_API_KEY")
+        if api_key and api_key != "your-openai-api-key-here":
             print("✅ OpenAI API key configured")
         else:
             print("❌ OpenAI API key not configured")
     else:
         print("❌ .env file not found")
 
-    # Check requirements
-    try:
-        import fastapi
-        import langchain
-        import aiohttp
+    # Check requirements (find_spec locates the packages without importing them)
+    missing = [name for name in ("fastapi", "openai", "aiohttp") if importlib.util.find_spec(name) is None]
+    if missing:
+        print(f"❌ Missing packages: {', '.join(missing)}")
+    else:
         print("✅ Required packages installed")
-    except ImportError as e:
-        print(f"❌ Missing package: {e}")
 
     # Check settings
-    errors = settings.validate()
+    errors = validate_settings()
     if errors:
         print("❌ Configuration errors found:")
         for error in errors:
@@ -106,7 +102,7 @@ async def analyze_repository(
     """Analyze a repository for vulnerabilities"""
 
     # Validate settings
-    errors = settings.validate()
+    errors = validate_settings()
     if errors:
         print("Configuration errors:")
         for error in errors:
@@ -114,6 +110,7 @@ async def analyze_repository(
         print("\nMake sure you have created a .env file with your configuration.")
         print("You can copy env.example to .env and update the values.")
         sys.exit(1)
+    settings = get_settings()
 
     # Create analysis request
     request = AnalysisRequest(
@@ -123,11 +120,25 @@ async def analyze_repository(
         triage_threshold=triage_threshold
     )
 
-    # Initialize analysis engine
+    # Initialize analysis engine (imported here so --check and --setup stay fast)
+    from app.core.analysis_engine import AnalysisEngine
     engine = AnalysisEngine(
         max_dependencies=request.max_dependencies,
         osv_api_url=settings.OSV_API_BASE_URL,
-        openai_api_key=settings.OPENAI_API_KEY
+        openai_api_key=settings.OPENAI_API_KEY,
+        openai_model=settings.OPENAI_MODEL,
+        openai_temperature=settings.OPENAI_TEMPERATURE,
+        openai_max_tokens=settings.OPENAI_MAX_TOKENS,
+        triage_concurrency=settings.TRIAGE_CONCURRENCY,
+        triage_batch_size=settings.TRIAGE_BATCH_SIZE,
+        cache_path=settings.CACHE_PATH,
+        osv_cache_ttl=settings.OSV_CACHE_TTL,
+        osv_batch_size=settings.OSV_BATCH,
+        triage_cache_ttl=settings.TRIAGE_CACHE_TTL,
+        triage_max_retries=settings.TRIAGE_MAX_RETRIES,
+        clone_timeout=settings.REPO_CLONE_TIMEOUT,
+        clone_dir=settings.REPO_CLONE_DIR,
+        mirror_dir=settings.REPO_MIRROR_DIR
     )
 
     try:
@@ -142,8 +153,7 @@ async def analyze_repository(
 
         # Save report if requested
         if save_report:
-            with open(save_report, 'w') as f:
-                json.dump(report.dict(), f, indent=2, default=str)
+            Path(save_report).write_text(report.model_dump_json(indent=2), encoding="utf-8")
             print(f"\n📄 Report saved to: {save_report}")
 
         # Exit with error code if real threats found
@@ -1,56 +1,184 @@
 import os
-from typing import Optional
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 
-# Load environment variables from .env file
 env_path = Path(__file__).parent.parent / ".env"
-load_dotenv(env_path)
 
+# OpenAI models that reject the json_schema response format triage requests rely on;
+# with them every LLM triage would fail and fall back to the rule-based verdict
+STRUCTURED_OUTPUT_UNSUPPORTED_MODELS = ("gpt-3.5", "gpt-4-", "gpt-4o-2024-05-13", "o1-mini", "o1-preview")
 
+
+def supports_structured_outputs(model: str) -> bool:
+    """Whether an OpenAI model accepts strict json_schema structured outputs"""
+    return model != "gpt-4" and not model.startswith(STRUCTURED_OUTPUT_UNSUPPORTED_MODELS)
+
+
+def _number(name: str, default, kind=int):
+    """Read a numeric environment variable, naming it when its value is not a number"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return kind(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+def load_env_file(path: Path = env_path) -> None:
+    """
+    Load the .env file into the environment, once
+
+    Variables already set in the environment take precedence over the file.
+    Deployments that set the environment directly (containers, Heroku) should set
+    MINOTAUR_SKIP_DOTENV=1 so the file is never looked for. After loading, the
+    variable is set so that later calls and child processes skip it too.
+    """
+    if os.environ.get("MINOTAUR_SKIP_DOTENV") == "1":
+        return
+    if path.is_file():
+        load_dotenv(path, override=False)
+        os.environ["MINOTAUR_SKIP_DOTENV"] = "1"
+
+
+@dataclass(frozen=True)
 class Settings:
     """Application settings"""
 
     # API Configuration
-    API_HOST: str = os.getenv("API_HOST", "0.0.0.0")
-    API_PORT: int = int(os.getenv("API_PORT", "8000"))
-    API_RELOAD: bool = os.getenv("API_RELOAD", "true").lower() == "true"
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8000
+    API_RELOAD: bool = False
+    # Comma-separated in the environment; "*" allows any origin
+    ALLOWED_ORIGINS: Tuple[str, ...] = ("*",)
+    WEB_CONCURRENCY: int = 1
 
     # OpenAI Configuration
-    OPENAI_API_KEY: Optional[str] = os.getenv("OPENAI_API_KEY")
-    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-    OPENAI_TEMPERATURE: float = float(os.getenv("OPENAI_TEMPERATURE", "0.1"))
-    OPENAI_MAX_TOKENS: int = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))
+    OPENAI_API_KEY: Optional[str] = None
+    OPENAI_MODEL: str = "gpt-4o-mini"
+    OPENAI_TEMPERATURE: float = 0.1
+    OPENAI_MAX_TOKENS: int = 1000
 
     # OSV Configuration
-    OSV_API_BASE_URL: str = os.getenv("OSV_API_BASE_URL", "https://api.osv.dev")
+    OSV_API_BASE_URL: str = "https://api.osv.dev"
+
+    OSV_CACHE_TTL: int = 86400
+    OSV_BATCH: int = 128
+
+    # Cache Configuration (set CACHE_PATH to an empty value to disable caching)
+    CACHE_PATH: Optional[str] = "~/.cache/minotaur/cache.db"
 
     # Repository Configuration
-    REPO_CLONE_TIMEOUT: int = int(os.getenv("REPO_CLONE_TIMEOUT", "300"))
-    MAX_DEPENDENCIES: int = int(os.getenv("MAX_DEPENDENCIES", "1000"))
+    REPO_CLONE_TIMEOUT: int = 300
+    REPO_CLONE_DIR: Optional[str] = None
+    REPO_MIRROR_DIR: Optional[str] = None
+    MAX_DEPENDENCIES: int = 1000
+
+    # Report Storage
+    REPORTS_DB_PATH: str = "reports/minotaur.db"
 
     # Analysis Configuration
-    TRIAGE_CONFIDENCE_THRESHOLD: float = float(os.getenv("TRIAGE_CONFIDENCE_THRESHOLD", "0.7"))
+    TRIAGE_CONFIDENCE_THRESHOLD: float = 0.7
+    TRIAGE_CONCURRENCY: int = 8
+    TRIAGE_BATCH_SIZE: int = 5
+    TRIAGE_CACHE_TTL: int = 604800
+    TRIAGE_MAX_RETRIES: int = 5
 
     # Logging Configuration
-    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVEL: str = "INFO"
 
     @classmethod
-    def validate(cls) -> list[str]:
+    def from_env(cls) -> "Settings":
+        """Read the settings from the environment, falling back to the defaults"""
+        env = os.environ
+        return cls(
+            API_HOST=env.get("API_HOST", cls.API_HOST),
+            API_PORT=_number("API_PORT", cls.API_PORT),
+            API_RELOAD=env.get("API_RELOAD", "false").lower() == "true",
+            ALLOWED_ORIGINS=tuple(
+                origin.strip() for origin in env.get("ALLOWED_ORIGINS", "*").split(",") if origin.strip()
+            ),
+            WEB_CONCURRENCY=_number("WEB_CONCURRENCY", cls.WEB_CONCURRENCY),
+            OPENAI_API_KEY=env.get("OPENAI_API_KEY"),
+            OPENAI_MODEL=env.get("OPENAI_MODEL", cls.OPENAI_MODEL),
+            OPENAI_TEMPERATURE=_number("OPENAI_TEMPERATURE", cls.OPENAI_TEMPERATURE, float),
+            OPENAI_MAX_TOKENS=_number("OPENAI_MAX_TOKENS", cls.OPENAI_MAX_TOKENS),
+            OSV_API_BASE_URL=env.get("OSV_API_BASE_URL", cls.OSV_API_BASE_URL),
+            OSV_CACHE_TTL=_number("OSV_CACHE_TTL", cls.OSV_CACHE_TTL),
+            OSV_BATCH=_number("OSV_BATCH", cls.OSV_BATCH),
+            CACHE_PATH=env.get("CACHE_PATH", cls.CACHE_PATH) or None,
+            REPO_CLONE_TIMEOUT=_number("REPO_CLONE_TIMEOUT", cls.REPO_CLONE_TIMEOUT),
+            REPO_CLONE_DIR=env.get("REPO_CLONE_DIR") or None,
+            REPO_MIRROR_DIR=env.get("REPO_MIRROR_DIR") or None,
+            MAX_DEPENDENCIES=_number("MAX_DEPENDENCIES", cls.MAX_DEPENDENCIES),
+            REPORTS_DB_PATH=env.get("REPORTS_DB_PATH", cls.REPORTS_DB_PATH),
+            TRIAGE_CONFIDENCE_THRESHOLD=_number("TRIAGE_CONFIDENCE_THRESHOLD", cls.TRIAGE_CONFIDENCE_THRESHOLD, float),
+            TRIAGE_CONCURRENCY=_number("TRIAGE_CONCURRENCY", cls.TRIAGE_CONCURRENCY),
+            TRIAGE_BATCH_SIZE=_number("TRIAGE_BATCH_SIZE", cls.TRIAGE_BATCH_SIZE),
+            TRIAGE_CACHE_TTL=_number("TRIAGE_CACHE_TTL", cls.TRIAGE_CACHE_TTL),
+            TRIAGE_MAX_RETRIES=_number("TRIAGE_MAX_RETRIES", cls.TRIAGE_MAX_RETRIES),
+            LOG_LEVEL=env.get("LOG_LEVEL", cls.LOG_LEVEL)
+        )
+
+    def validate(self) -> list[str]:
         """Validate required settings"""
         errors = []
 
-        if not cls.OPENAI_API_KEY:
+        if not 0 < self.API_PORT < 65536:
+            errors.append("API_PORT must be between 1 and 65535")
+
+        if self.WEB_CONCURRENCY <= 0:
+            errors.append("WEB_CONCURRENCY must be positive")
+
+        if not self.OPENAI_API_KEY:
             errors.append("OPENAI_API_KEY is required for LLM-based triage")
 
-        if cls.MAX_DEPENDENCIES <= 0:
+        if not supports_structured_outputs(self.OPENAI_MODEL):
+            errors.append(f"OPENAI_MODEL {self.OPENAI_MODEL} does not support structured outputs (use e.g. gpt-4o-mini)")
+
+        if self.MAX_DEPENDENCIES <= 0:
             errors.append("MAX_DEPENDENCIES must be positive")
 
-        if cls.TRIAGE_CONFIDENCE_THRESHOLD < 0 or cls.TRIAGE_CONFIDENCE_THRESHOLD > 1:
+        if self.TRIAGE_CONFIDENCE_THRESHOLD < 0 or self.TRIAGE_CONFIDENCE_THRESHOLD > 1:
             errors.append("TRIAGE_CONFIDENCE_THRESHOLD must be between 0 and 1")
 
+        if self.TRIAGE_CONCURRENCY <= 0:
+            errors.append("TRIAGE_CONCURRENCY must be positive")
+
+        if self.TRIAGE_BATCH_SIZE <= 0:
+            errors.append("TRIAGE_BATCH_SIZE must be positive")
+
+        if self.TRIAGE_MAX_RETRIES < 0:
+            errors.append("TRIAGE_MAX_RETRIES must not be negative")
+
         return errors
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """
+    Return the application settings
+
+    The .env file and the environment are read on the first call only; later calls
+    return the same immutable instance.
+    """
+    load_env_file()
+    return Settings.from_env()
+
+
+@lru_cache(maxsize=1)
+def validate_settings() -> tuple[str, ...]:
+    """
+    Return the errors of the application settings
+
+    The settings never change once read, so they are validated on the first call only.
+    A value that cannot be read at all, such as a non-numeric port, is reported too.
+    """
+    try:
+        settings = get_settings()
+    except ValueError as e:
+        return (str(e),)
+    return tuple(settings.validate())
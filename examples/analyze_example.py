@@ -4,8 +4,10 @@ Example script demonstrating how to use Minotaur programmatically
 """
 
 import asyncio
-import json
 import os
+import sys
+from pathlib import Path
+
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -39,29 +41,36 @@ async def analyze_example_repository():
         # Perform the analysis
         report = await engine.analyze_repository(request)
 
-        # Print summary
-        print(f"\nAnalysis completed!")
-        print(f"Repository: {report.repo_url}")
-        print(f"Dependencies analyzed: {report.dependencies_analyzed}")
-        print(f"Vulnerabilities found: {report.vulnerabilities_found}")
-        print(f"Real threats: {report.real_threats}")
-        print(f"Analysis duration: {report.analysis_duration:.2f} seconds")
+        # Build the summary and details, then write them out at once
+        lines = [
+            "",
+            "Analysis completed!",
+            f"Repository: {report.repo_url}",
+            f"Dependencies analyzed: {report.dependencies_analyzed}",
+            f"Vulnerabilities found: {report.vulnerabilities_found}",
+            f"Real threats: {report.real_threats}",
+            f"Analysis duration: {report.analysis_duration:.2f} seconds"
+        ]
 
-        # Print detailed results
         if report.vulnerability_reports:
-            print(f"\nVulnerability Details:")
+            lines.extend(["", "Vulnerability Details:"])
             for vuln_report in report.vulnerability_reports:
-                print(f"\n• {vuln_report.dependency} {vuln_report.dependency_version}")
-                print(f"  Vulnerability: {vuln_report.vulnerability.id}")
-                print(f"  Summary: {vuln_report.vulnerability.summary}")
-                print(f"  Is Real Threat: {vuln_report.is_real_threat}")
-                print(f"  Threat Level: {vuln_report.threat_level}")
-                print(f"  Recommendation: {vuln_report.recommendation}")
-                print(f"  Confidence: {vuln_report.triage_confidence:.2f}")
+                lines.extend([
+                    "",
+                    f"• {vuln_report.dependency} {vuln_report.dependency_version}",
+                    f"  Vulnerability: {vuln_report.vulnerability.id}",
+                    f"  Summary: {vuln_report.vulnerability.summary}",
+                    f"  Is Real Threat: {vuln_report.is_real_threat}",
+                    f"  Threat Level: {vuln_report.threat_level}",
+                    f"  Recommendation: {vuln_report.recommendation}",
+                    f"  Confidence: {vuln_report.triage_confidence:.2f}"
+                ])
+
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
 
         # Save report to file
-        with open("analysis_report.json", "w") as f:
-            json.dump(report.dict(), f, indent=2, default=str)
+        Path("analysis_report.json").write_text(report.model_dump_json(indent=2))
         print(f"\nDetailed report saved to analysis_report.json")
 
     except Exception as e:
@@ -3,7 +3,7 @@
 Setup script for Minotaur - helps users configure their environment
 """
 
-import os
+import shutil
 import sys
 from pathlib import Path
 
@@ -22,11 +22,7 @@ def create_env_file():
         return False
 
     # Copy env.example to .env
-    with open(env_example, 'r') as src:
-        content = src.read()
-
-    with open(env_file, 'w') as dst:
-        dst.write(content)
+    shutil.copyfile(env_example, env_file)
 
     print("✅ Created .env file from template")
     print("📝 Please edit .env and add your OpenAI API key")
@@ -41,8 +37,7 @@ def check_env_file():
         print("❌ .env file not found")
         return False
 
-    with open(env_file, 'r') as f:
-        content = f.read()
+    content = env_file.read_text()
 
     if "your-openai-api-key-here" in content:
         print("⚠️  Please update your OpenAI API key in .env file")
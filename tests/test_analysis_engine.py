@@ -1,13 +1,72 @@
+import subprocess
 import pytest
-from unittest.mock import AsyncMock, patch, MagicMock
-from datetime import datetime
+from unittest.mock import patch
+from pathlib import Path
 
 from app.core.analysis_engine import AnalysisEngine
-from app.models.analysis import AnalysisRequest, AnalysisResponse
+from app.models.analysis import AnalysisRequest, AnalysisResponse, AnalysisStatus, TriageResult
 from app.models.dependency import Dependency, DependencyType
 from app.models.vulnerability import Vulnerability, VulnerabilityReport, ThreatLevel
 
 
+class FakeRepositoryService:
+    """Repository service that pretends to clone, or fails with the given error"""
+
+    def __init__(self, error=None, files=()):
+        self.error = error
+        self.files = list(files)
+        self.cleaned = []
+
+    def validate_repo_url(self, repo_url):
+        pass
+
+    async def clone_repository(self, repo_url):
+        if self.error:
+            raise self.error
+        return Path("/nonexistent/repo")
+
+    async def list_files(self, repo_path):
+        return self.files
+
+    def cleanup(self, repo_path=None):
+        self.cleaned.append(repo_path)
+
+
+class FakeDependencyService:
+    """Dependency service returning fixed dependencies and usage"""
+
+    def __init__(self, dependencies=(), usage=None):
+        self.dependencies = list(dependencies)
+        self.usage = usage or {}
+
+    async def analyze(self, repo_path):
+        return self.dependencies, self.usage
+
+
+class FakeTriageService:
+    """Triage service that records its groups and gives every item the same verdict"""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.groups = []
+
+    async def triage_batch(self, items, repo_context):
+        self.groups.append(items)
+        if self.error:
+            raise self.error
+        return [self.result] * len(items)
+
+
+def make_engine(**services):
+    """An engine on fake services, real where none is given"""
+    return AnalysisEngine(
+        openai_api_key="test-key",
+        repository_service=services.pop("repository_service", FakeRepositoryService()),
+        **services
+    )
+
+
 class TestAnalysisEngine:
     """Test cases for AnalysisEngine"""
 
@@ -19,7 +78,7 @@ class TestAnalysisEngine:
             openai_api_key="test-key"
         )
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_request(self):
         return AnalysisRequest(
             repo_url="https://github.com/testuser/testrepo",
@@ -28,7 +87,7 @@ class TestAnalysisEngine:
             triage_threshold=0.7
         )
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_dependencies(self):
         return [
             Dependency(
@@ -45,7 +104,18 @@ class TestAnalysisEngine:
             )
         ]
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
+    def triage_result(self):
+        return TriageResult(
+            is_real_threat=True,
+            threat_level=ThreatLevel.HIGH,
+            impact_summary="Test impact",
+            recommendation="Update package",
+            confidence=0.8,
+            reasoning="Test reasoning"
+        )
+
+    @pytest.fixture(scope="module")
     def sample_vulnerabilities(self):
         return [
             Vulnerability(
@@ -62,90 +132,183 @@ class TestAnalysisEngine:
         ]
 
     @pytest.mark.asyncio
-    async def test_analyze_repository_success(self, engine, sample_request, sample_dependencies, sample_vulnerabilities):
+    async def test_analyze_repository_success(self, sample_request, sample_dependencies, sample_vulnerabilities, triage_result):
         """Test successful repository analysis - simplified version"""
-        # Mock all the services
-        with patch.object(engine.repository_service, 'clone_repository') as mock_clone, \
-             patch.object(engine.dependency_service, 'extract_dependencies') as mock_extract, \
-             patch.object(engine.dependency_service, 'is_dependency_used') as mock_usage, \
-             patch.object(engine.triage_service, 'triage_vulnerability') as mock_triage:
-
-            # Setup mocks
-            mock_clone.return_value = MagicMock()
-            mock_extract.return_value = sample_dependencies
-            mock_usage.return_value = True
-
-            # Mock triage service
-            mock_triage.return_value = MagicMock(
-                is_real_threat=True,
-                threat_level=ThreatLevel.HIGH,
-                impact_summary="Test impact",
-                recommendation="Update package",
-                confidence=0.8,
-                reasoning="Test reasoning"
-            )
+        repository_service = FakeRepositoryService()
+        engine = make_engine(
+            repository_service=repository_service,
+            dependency_service=FakeDependencyService(sample_dependencies, {"requests": True, "express": True}),
+            triage_service=FakeTriageService(triage_result)
+        )
 
-            # Mock the entire vulnerability analysis step
-            with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
-                mock_vuln_analysis.return_value = [
-                    (sample_vulnerabilities[0], sample_dependencies[0])
-                ]
+        # Mock the entire vulnerability analysis step
+        with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
+            mock_vuln_analysis.return_value = [
+                (sample_vulnerabilities[0], sample_dependencies[0])
+            ]
 
-                # Perform analysis
-                response = await engine.analyze_repository(sample_request)
+            # Perform analysis
+            response = await engine.analyze_repository(sample_request)
 
-                # Verify response
-                assert isinstance(response, AnalysisResponse)
-                assert response.repo_url == str(sample_request.repo_url)
-                assert response.dependencies_analyzed == 2
-                assert response.vulnerabilities_found == 1
-                assert response.real_threats == 1
-                assert response.analysis_duration > 0
-                assert len(response.errors) == 0
+        # Verify response
+        assert isinstance(response, AnalysisResponse)
+        assert response.repo_url == str(sample_request.repo_url)
+        assert response.dependencies_analyzed == 2
+        assert response.vulnerabilities_found == 1
+        assert response.real_threats == 1
+        assert response.analysis_duration > 0
+        assert len(response.errors) == 0
+        assert repository_service.cleaned == [Path("/nonexistent/repo")]
 
     @pytest.mark.asyncio
-    async def test_analyze_repository_no_dependencies(self, engine, sample_request):
+    async def test_analyze_repository_no_dependencies(self, sample_request):
         """Test analysis when no dependencies are found"""
-        with patch.object(engine.repository_service, 'clone_repository') as mock_clone, \
-             patch.object(engine.dependency_service, 'extract_dependencies') as mock_extract:
+        engine = make_engine(dependency_service=FakeDependencyService())
 
-            mock_clone.return_value = MagicMock()
-            mock_extract.return_value = []
+        response = await engine.analyze_repository(sample_request)
+
+        assert response.dependencies_analyzed == 0
+        assert response.vulnerabilities_found == 0
+        assert response.real_threats == 0
+        assert "No dependencies found" in response.errors[0]
+
+    @pytest.mark.asyncio
+    async def test_analyze_repository_error(self, sample_request):
+        """Test analysis when an error occurs"""
+        engine = make_engine(repository_service=FakeRepositoryService(error=Exception("Test error")))
+
+        response = await engine.analyze_repository(sample_request)
+
+        assert response.status == AnalysisStatus.FAILED
+        assert response.dependencies_analyzed == 0
+        assert response.vulnerabilities_found == 0
+        assert response.real_threats == 0
+        assert "Analysis failed" in response.errors[0]
+
+    @pytest.mark.asyncio
+    async def test_analyze_repository_uses_given_report_id(self, sample_request):
+        """Test that a report ID reserved by the caller is kept"""
+        engine = make_engine(dependency_service=FakeDependencyService())
+
+        response = await engine.analyze_repository(sample_request, report_id="report-1")
+
+        assert response.report_id == "report-1"
+        assert response.status == AnalysisStatus.DONE
+
+    @pytest.mark.asyncio
+    async def test_analyze_repository_triage_error(self, sample_request, sample_dependencies, sample_vulnerabilities):
+        """Test that a failing triage call is reported without aborting the analysis"""
+        engine = make_engine(
+            dependency_service=FakeDependencyService(sample_dependencies, {"requests": True, "express": True}),
+            triage_service=FakeTriageService(error=Exception("LLM unavailable"))
+        )
+
+        with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
+            mock_vuln_analysis.return_value = [
+                (sample_vulnerabilities[0], sample_dependencies[0])
+            ]
 
             response = await engine.analyze_repository(sample_request)
 
-            assert response.dependencies_analyzed == 0
-            assert response.vulnerabilities_found == 0
-            assert response.real_threats == 0
-            assert "No dependencies found" in response.errors[0]
+        assert response.dependencies_analyzed == 2
+        assert response.vulnerabilities_found == 1
+        assert response.real_threats == 1
+        assert response.vulnerability_reports[0].triage_confidence == 0.5
+        assert "Triage failed for CVE-2023-1234" in response.errors[0]
 
     @pytest.mark.asyncio
-    async def test_analyze_repository_error(self, engine, sample_request):
-        """Test analysis when an error occurs"""
-        with patch.object(engine.repository_service, 'clone_repository') as mock_clone:
-            mock_clone.side_effect = Exception("Test error")
+    async def test_analyze_repository_groups_triage(self, sample_request, sample_dependencies, sample_vulnerabilities, triage_result):
+        """Test that vulnerabilities are triaged in groups of triage_batch_size"""
+        triage_service = FakeTriageService(triage_result)
+        engine = make_engine(
+            triage_batch_size=2,
+            dependency_service=FakeDependencyService(sample_dependencies, {"requests": False}),
+            triage_service=triage_service
+        )
+        vulns = [
+            sample_vulnerabilities[0].model_copy(update={"id": f"CVE-{i}"}) for i in range(3)
+        ]
+
+        with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
+            mock_vuln_analysis.return_value = [(vuln, sample_dependencies[0]) for vuln in vulns]
 
             response = await engine.analyze_repository(sample_request)
 
-            assert response.dependencies_analyzed == 0
-            assert response.vulnerabilities_found == 0
-            assert response.real_threats == 0
-            assert "Analysis failed" in response.errors[0]
+        assert [len(items) for items in triage_service.groups] == [2, 1]
+        assert triage_service.groups[0][0][2] is False
+        assert [r.vulnerability.id for r in response.vulnerability_reports] == ["CVE-0", "CVE-1", "CVE-2"]
 
-    def test_generate_repo_context(self, engine, sample_dependencies):
-        """Test repository context generation"""
-        repo_path = MagicMock()
-
-        # Mock file extensions
-        mock_files = [
-            MagicMock(suffix='.py'),
-            MagicMock(suffix='.js'),
-            MagicMock(suffix='.json'),
-            MagicMock(suffix='.md')
+    @pytest.mark.asyncio
+    async def test_analyze_repository_skips_unused_transitive(self, sample_request, sample_vulnerabilities):
+        """Test that unused transitive dependencies are triaged without the LLM"""
+        transitive = Dependency(
+            name="urllib3",
+            version="1.26.0",
+            dependency_type=DependencyType.PYTHON,
+            is_direct=False,
+            parent="requests"
+        )
+        triage_service = FakeTriageService()
+        engine = make_engine(
+            dependency_service=FakeDependencyService([transitive], {"urllib3": False}),
+            triage_service=triage_service
+        )
+
+        with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
+            mock_vuln_analysis.return_value = [(sample_vulnerabilities[0], transitive)]
+
+            response = await engine.analyze_repository(sample_request)
+
+        assert triage_service.groups == []
+        assert response.vulnerabilities_found == 1
+        assert response.real_threats == 0
+        assert response.vulnerability_reports[0].threat_level == ThreatLevel.LOW
+
+    def test_settings_reach_services(self):
+        """Test that model and clone options are passed on to the services using them"""
+        engine = AnalysisEngine(
+            openai_api_key="test-key",
+            openai_model="gpt-4.1-mini",
+            openai_temperature=0.3,
+            openai_max_tokens=500,
+            clone_timeout=42
+        )
+
+        assert engine.triage_service.model == "gpt-4.1-mini"
+        assert engine.triage_service.temperature == 0.3
+        assert engine.triage_service.max_tokens == 500
+        assert engine.repository_service.clone_timeout == 42
+
+    def test_deduplicate_dependencies(self, engine, sample_dependencies):
+        """Test that repeated dependencies are looked up once, preferring direct ones"""
+        transitive = Dependency(
+            name="express",
+            version="4.17.1",
+            dependency_type=DependencyType.NPM,
+            is_direct=False
+        )
+        other_version = Dependency(
+            name="requests",
+            version="2.31.0",
+            dependency_type=DependencyType.PYTHON,
+            is_direct=True
+        )
+
+        unique = engine._deduplicate_dependencies(
+            [transitive] + sample_dependencies + [sample_dependencies[0], other_version]
+        )
+
+        assert [(d.name, d.version, d.is_direct) for d in unique] == [
+            ("express", "4.17.1", True),
+            ("requests", "2.25.0", True),
+            ("requests", "2.31.0", True)
         ]
-        repo_path.rglob.return_value = mock_files
 
-        context = engine._generate_repo_context(repo_path, sample_dependencies)
+    def test_generate_repo_context(self, engine, sample_dependencies):
+        """Test repository context generation"""
+        context = engine._generate_repo_context(
+            sample_dependencies, ["app.py", "src/index.js", "package.json", "README.md"]
+        )
 
         assert "2 dependencies" in context
         assert "JavaScript/Node.js dependencies: 1" in context
@@ -154,6 +317,36 @@ class TestAnalysisEngine:
         assert ".py" in context
         assert ".js" in context
 
+    def test_collect_extensions(self, engine):
+        """Test that files in vendored directories are not counted"""
+        assert engine._collect_extensions(["app.py", "node_modules/express/index.js"]) == {".py"}
+
+    def test_collect_extensions_cap(self, engine):
+        """Test that only the most common suffixes up to the cap are kept"""
+        assert len(engine._collect_extensions(["file.py", "file.js", "file.md", "file.txt"], cap=2)) == 2
+
+    def test_collect_extensions_skips_extensionless(self, engine):
+        """Test that files without a suffix do not count as a file type"""
+        assert engine._collect_extensions(["LICENSE", "Makefile", "Dockerfile", "app.py"], cap=1) == {".py"}
+
+    @pytest.mark.asyncio
+    async def test_repo_context_lists_sparse_files(self, engine, tmp_path):
+        """Test that the context names file types the sparse checkout left out"""
+        git = ["git", "-C", str(tmp_path), "-c", "user.name=test", "-c", "user.email=test@example.com"]
+        (tmp_path / "app.py").write_text("import requests\n")
+        (tmp_path / "docs").mkdir()
+        (tmp_path / "docs" / "guide.md").write_text("# Guide\n")
+        subprocess.run(["git", "init", "-q", str(tmp_path)], check=True)
+        subprocess.run([*git, "add", "."], check=True)
+        subprocess.run([*git, "commit", "-q", "-m", "Initial commit"], check=True)
+        await engine.repository_service._sparse_checkout(tmp_path)
+        assert not (tmp_path / "docs" / "guide.md").exists()
+
+        file_paths = await engine.repository_service.list_files(tmp_path)
+
+        assert sorted(file_paths) == ["app.py", "docs/guide.md"]
+        assert ".md" in engine._generate_repo_context([], file_paths)
+
     def test_calculate_threat_counts(self, engine):
         """Test threat level counting"""
         # Create a proper Vulnerability object
@@ -213,7 +406,7 @@ class TestAnalysisEngine:
         assert ThreatLevel.CRITICAL not in counts
 
     @pytest.mark.asyncio
-    async def test_analyze_repository_with_transitive_dependencies(self, engine, sample_request):
+    async def test_analyze_repository_with_transitive_dependencies(self, sample_request):
         """Test analysis with transitive dependencies - simplified version"""
         dependencies = [
             Dependency(
@@ -231,30 +424,17 @@ class TestAnalysisEngine:
             )
         ]
 
-        with patch.object(engine.repository_service, 'clone_repository') as mock_clone, \
-             patch.object(engine.dependency_service, 'extract_dependencies') as mock_extract, \
-             patch.object(engine.dependency_service, 'is_dependency_used') as mock_usage, \
-             patch.object(engine.triage_service, 'triage_vulnerability') as mock_triage:
-
-            mock_clone.return_value = MagicMock()
-            mock_extract.return_value = dependencies
-            mock_usage.return_value = True
-
-            mock_triage.return_value = MagicMock(
-                is_real_threat=False,
-                threat_level=ThreatLevel.LOW,
-                impact_summary="No impact",
-                recommendation="No action needed",
-                confidence=0.9,
-                reasoning="No vulnerabilities found"
-            )
+        engine = make_engine(
+            dependency_service=FakeDependencyService(dependencies, {"requests": True, "urllib3": True}),
+            triage_service=FakeTriageService()
+        )
 
-            # Mock the entire vulnerability analysis step
-            with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
-                mock_vuln_analysis.return_value = []  # No vulnerabilities
+        # Mock the entire vulnerability analysis step
+        with patch.object(engine, '_analyze_vulnerabilities') as mock_vuln_analysis:
+            mock_vuln_analysis.return_value = []  # No vulnerabilities
 
-                response = await engine.analyze_repository(sample_request)
+            response = await engine.analyze_repository(sample_request)
 
-                assert response.dependencies_analyzed == 2
-                assert response.vulnerabilities_found == 0
-                assert response.real_threats == 0
+        assert response.dependencies_analyzed == 2
+        assert response.vulnerabilities_found == 0
+        assert response.real_threats == 0
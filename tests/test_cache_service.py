@@ -0,0 +1,34 @@
+import pytest
+from unittest.mock import patch
+
+from app.services.cache_service import CacheService
+
+
+class TestCacheService:
+    """Test cases for CacheService"""
+
+    @pytest.fixture
+    def cache(self, tmp_path):
+        cache = CacheService(str(tmp_path / "cache.db"))
+        yield cache
+        cache.close()
+
+    def test_set_and_get(self, cache):
+        """Test storing and retrieving values"""
+        cache.set("a", "1", expire=60)
+        cache.set_many({"b": "2", "c": "3"}, expire=60)
+
+        assert cache.get("a") == "1"
+        assert cache.get("missing") is None
+        assert cache.get_many(["a", "b", "c", "missing"]) == {"a": "1", "b": "2", "c": "3"}
+
+    def test_expiry(self, cache):
+        """Test that expired values are not returned"""
+        with patch("app.services.cache_service.time.time", return_value=1000.0):
+            cache.set("a", "1", expire=10)
+
+        with patch("app.services.cache_service.time.time", return_value=1005.0):
+            assert cache.get("a") == "1"
+
+        with patch("app.services.cache_service.time.time", return_value=1010.0):
+            assert cache.get("a") is None
@@ -1,66 +1,66 @@
+import os
 import pytest
 import tempfile
 import json
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
-from app.services.dependency_service import DependencyService
+from app.services.dependency_service import DependencyService, IMPORT_PATTERNS, _record_usage, create_scan_executor
 from app.models.dependency import Dependency, DependencyType
 
 
 class TestDependencyService:
     """Test cases for DependencyService"""
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def service(self):
         return DependencyService(max_dependencies=100)
 
-    @pytest.fixture
-    def temp_repo(self):
-        """Create a temporary repository with package files"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            repo_path = Path(temp_dir)
-
-            # Create package.json
-            package_json = {
-                "name": "test-project",
-                "version": "1.0.0",
-                "dependencies": {
-                    "express": "^4.17.1",
-                    "lodash": "^4.17.21"
-                },
-                "devDependencies": {
-                    "jest": "^27.0.0"
-                }
+    @pytest.fixture(scope="module")
+    def temp_repo(self, tmp_path_factory):
+        """Create a temporary repository with package files, shared by the module's tests"""
+        repo_path = tmp_path_factory.mktemp("npm_repo")
+
+        # Create package.json
+        package_json = {
+            "name": "test-project",
+            "version": "1.0.0",
+            "dependencies": {
+                "express": "^4.17.1",
+                "lodash": "^4.17.21"
+            },
+            "devDependencies": {
+                "jest": "^27.0.0"
             }
-
-            with open(repo_path / "package.json", "w") as f:
-                json.dump(package_json, f)
-
-            # Create package-lock.json
-            package_lock = {
-                "dependencies": {
-                    "express": {
-                        "version": "4.17.1",
-                        "dependencies": {
-                            "accepts": {
-                                "version": "1.3.7"
-                            }
+        }
+
+        with open(repo_path / "package.json", "w") as f:
+            json.dump(package_json, f)
+
+        # Create package-lock.json
+        package_lock = {
+            "dependencies": {
+                "express": {
+                    "version": "4.17.1",
+                    "dependencies": {
+                        "accepts": {
+                            "version": "1.3.7"
                         }
-                    },
-                    "lodash": {
-                        "version": "4.17.21"
-                    },
-                    "jest": {
-                        "version": "27.0.0"
                     }
+                },
+                "lodash": {
+                    "version": "4.17.21"
+                },
+                "jest": {
+                    "version": "27.0.0"
                 }
             }
+        }
 
-            with open(repo_path / "package-lock.json", "w") as f:
-                json.dump(package_lock, f)
+        with open(repo_path / "package-lock.json", "w") as f:
+            json.dump(package_lock, f)
 
-            yield repo_path
+        return repo_path
 
     @pytest.mark.asyncio
     async def test_extract_npm_dependencies(self, service, temp_repo):
@@ -84,23 +84,22 @@ class TestDependencyService:
         assert jest_dep.dependency_type == DependencyType.NPM
         assert jest_dep.is_direct is True
 
-    @pytest.fixture
-    def python_repo(self):
-        """Create a temporary repository with Python package files"""
-        with tempfile.TemporaryDirectory() as temp_dir:
-            repo_path = Path(temp_dir)
+    @pytest.fixture(scope="module")
+    def python_repo(self, tmp_path_factory):
+        """Create a temporary repository with Python package files, shared by the module's tests"""
+        repo_path = tmp_path_factory.mktemp("python_repo")
 
-            # Create requirements.txt
-            requirements_content = """
+        # Create requirements.txt
+        requirements_content = """
 requests>=2.25.0,<3.0.0
 flask==2.0.1
 pytest>=6.0.0
-            """.strip()
+        """.strip()
 
-            with open(repo_path / "requirements.txt", "w") as f:
-                f.write(requirements_content)
+        with open(repo_path / "requirements.txt", "w") as f:
+            f.write(requirements_content)
 
-            yield repo_path
+        return repo_path
 
     @pytest.mark.asyncio
     async def test_extract_python_dependencies(self, service, python_repo):
@@ -119,6 +118,75 @@ pytest>=6.0.0
         assert flask_dep.dependency_type == DependencyType.PYTHON
         assert flask_dep.version == "2.0.1"
 
+    @pytest.mark.asyncio
+    async def test_extract_poetry_dependencies(self, service, tmp_path):
+        """Test extracting Python dependencies from pyproject.toml"""
+        (tmp_path / "pyproject.toml").write_text(
+            '[tool.poetry.dependencies]\n'
+            'python = "^3.11"\n'
+            'requests = "^2.25.0"\n'
+            'fastapi = { version = "0.104.1", extras = ["all"] }\n'
+            '\n'
+            '[tool.poetry.dev-dependencies]\n'
+            'pytest = "7.4.3"\n'
+        )
+
+        dependencies = await service.extract_dependencies(tmp_path)
+
+        versions = {d.name: d.version for d in dependencies}
+        assert versions == {"python": "^3.11", "requests": "^2.25.0", "fastapi": "0.104.1", "pytest": "7.4.3"}
+        assert next(d for d in dependencies if d.name == "pytest").metadata["type"] == "dev-dependencies"
+
+    @pytest.mark.asyncio
+    async def test_extract_dependencies_skips_broken_manifest(self, service, tmp_path):
+        """Test that a manifest that fails to parse does not discard the others"""
+        (tmp_path / "requirements.txt").write_text("requests==2.25.0\nflask==2.0.1\n")
+        (tmp_path / "pyproject.toml").write_text("[tool.poetry.dependencies\n")
+
+        dependencies = await service.extract_dependencies(tmp_path)
+
+        assert {d.name for d in dependencies} == {"requests", "flask"}
+
+    def test_extract_npm_lock_dependencies_deep(self, service):
+        """Test that deeply nested lockfiles do not hit the recursion limit"""
+        lock_data = {}
+        node = lock_data
+        for i in range(5000):
+            child = {"version": "1.0.0"}
+            node["dependencies"] = {f"pkg{i}": child}
+            node = child
+
+        dependencies = service._extract_npm_lock_dependencies(lock_data)
+
+        assert len(dependencies.names) == 5000
+        assert dependencies.parents[dependencies.index["pkg0"]] is None
+        assert dependencies.parents[dependencies.index["pkg4999"]] == "pkg4998"
+
+    def test_extract_npm_lock_packages(self, service):
+        """Test extracting dependencies from a v2/v3 lockfile packages map"""
+        lock_data = {
+            "lockfileVersion": 3,
+            "packages": {
+                "": {"name": "test-project", "dependencies": {"express": "^4.17.1"}},
+                "node_modules/express": {"version": "4.17.1", "integrity": "sha512-abc"},
+                "node_modules/express/node_modules/debug": {"version": "2.6.9"},
+                "node_modules/@babel/core": {"version": "7.22.0"},
+                "node_modules/@babel/core/node_modules/semver": {"version": "6.3.1"},
+                "node_modules/semver": {"version": "7.5.4"},
+                "packages/local": {"version": "1.0.0"},
+                "node_modules/local": {"resolved": "packages/local", "link": True}
+            }
+        }
+
+        dependencies = service._extract_npm_lock_dependencies(lock_data)
+
+        index = dependencies.index
+        assert set(dependencies.names) == {"express", "debug", "@babel/core", "semver"}
+        assert dependencies.parents[index["express"]] is None
+        assert dependencies.integrities[index["express"]] == "sha512-abc"
+        assert dependencies.parents[index["debug"]] == "express"
+        assert dependencies.versions[index["semver"]] == "7.5.4"
+
     def test_parse_requirement_line(self, service):
         """Test parsing requirement lines"""
         # Test exact version
@@ -141,6 +209,20 @@ pytest>=6.0.0
         assert name == "requests"
         assert version == "*"
 
+        # Test extras and environment markers
+        name, version = service._parse_requirement_line('requests[socks]==2.25.0; python_version < "3.8"')
+        assert name == "requests"
+        assert version == "2.25.0"
+
+        # Test lines that are not package requirements
+        assert service._parse_requirement_line("-r base.txt")[0] == ""
+        assert service._parse_requirement_line("git+https://github.com/psf/requests")[0] == ""
+
+        # Test unstripped lines as read from the file
+        assert service._parse_requirement_line("  flask>=2.0  # web\n") == ("flask", "2.0")
+        assert service._parse_requirement_line("# just a comment\n")[0] == ""
+        assert service._parse_requirement_line("\n")[0] == ""
+
     @pytest.fixture
     def js_repo_with_imports(self):
         """Create a repository with JavaScript imports"""
@@ -217,6 +299,161 @@ import numpy as np
         )
         assert service.is_dependency_used(unused_dep, python_repo_with_imports) is False
 
+    def test_scan_usage(self, service, js_repo_with_imports):
+        """Test checking usage of many dependencies in a single scan"""
+        (js_repo_with_imports / "app.py").write_text("import requests\nfrom flask import Flask\n")
+
+        dependencies = [
+            Dependency(name="express", version="4.17.1", dependency_type=DependencyType.NPM),
+            Dependency(name="lodash", version="4.17.21", dependency_type=DependencyType.NPM),
+            Dependency(name="unused-package", version="1.0.0", dependency_type=DependencyType.NPM),
+            Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON),
+            Dependency(name="flask", version="2.0.1", dependency_type=DependencyType.PYTHON),
+            Dependency(name="numpy", version="1.21.0", dependency_type=DependencyType.PYTHON),
+        ]
+
+        usage = service.scan_usage(dependencies, js_repo_with_imports)
+
+        assert usage == {
+            "express": True,
+            "lodash": True,
+            "unused-package": False,
+            "requests": True,
+            "flask": True,
+            "numpy": False,
+        }
+
+    def test_scan_usage_shared_prefixes(self, service, tmp_path):
+        """Test that names sharing a prefix are told apart"""
+        (tmp_path / "index.js").write_text(
+            "const session = require('express-session');\nimport '@types/node';\n"
+        )
+
+        dependencies = [
+            Dependency(name=name, version="1.0.0", dependency_type=DependencyType.NPM)
+            for name in ["express", "express-session", "@types/node", "@types/nodes"]
+        ]
+
+        usage = service.scan_usage(dependencies, tmp_path)
+
+        assert usage == {
+            "express": False,
+            "express-session": True,
+            "@types/node": True,
+            "@types/nodes": False,
+        }
+
+    def test_usage_matches_submodule_imports(self, service, tmp_path):
+        """Test that imports of a subpath or submodule count as using the package, in both checks"""
+        (tmp_path / "index.js").write_text("const fp = require('lodash/fp');\nimport x from './local';\n")
+        (tmp_path / "app.py").write_text("from requests.adapters import HTTPAdapter\nimport flask.json\n")
+
+        dependencies = [
+            Dependency(name="lodash", version="4.17.21", dependency_type=DependencyType.NPM),
+            Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON),
+            Dependency(name="flask", version="2.0.1", dependency_type=DependencyType.PYTHON),
+            Dependency(name="django", version="3.2.0", dependency_type=DependencyType.PYTHON),
+        ]
+
+        expected = {"lodash": True, "requests": True, "flask": True, "django": False}
+        assert service.scan_usage(dependencies, tmp_path) == expected
+        assert {dep.name: service.is_dependency_used(dep, tmp_path) for dep in dependencies} == expected
+
+    def test_usage_skips_files_without_imports(self, service, tmp_path):
+        """Test that files without an import keyword are not matched against the import pattern"""
+        (tmp_path / "app.py").write_text("import requests\n")
+        (tmp_path / "constants.py").write_text("TIMEOUT = 30\n")
+        pattern = MagicMock(wraps=IMPORT_PATTERNS[DependencyType.PYTHON])
+
+        with patch.dict(IMPORT_PATTERNS, {DependencyType.PYTHON: pattern}):
+            dep = Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON)
+            assert service.is_dependency_used(dep, tmp_path) is True
+
+        assert pattern.finditer.call_count == 1
+
+    def test_scan_usage_large_and_vendored_files(self, service, tmp_path):
+        """Test that large files are scanned and vendored code and bundles are skipped"""
+        (tmp_path / "app.js").write_text("// padding\n" * 1000 + "import express from 'express';\n")
+        (tmp_path / "vendor.min.js").write_text("require('lodash')")
+        (tmp_path / "node_modules" / "express").mkdir(parents=True)
+        (tmp_path / "node_modules" / "express" / "index.js").write_text("require('lodash')")
+
+        dependencies = [
+            Dependency(name="express", version="4.17.1", dependency_type=DependencyType.NPM),
+            Dependency(name="lodash", version="4.17.21", dependency_type=DependencyType.NPM),
+        ]
+
+        assert service.scan_usage(dependencies, tmp_path) == {"express": True, "lodash": False}
+
+    def test_usage_checks_see_tree_changes(self, service, tmp_path):
+        """Test that usage checks of the same path are not answered from an earlier walk"""
+        dep = Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON)
+        (tmp_path / "app.py").write_text("import flask\n")
+        assert service.is_dependency_used(dep, tmp_path) is False
+
+        (tmp_path / "client.py").write_text("import requests\n")
+        assert service.is_dependency_used(dep, tmp_path) is True
+
+    @pytest.mark.asyncio
+    async def test_analyze(self, service, python_repo_with_imports):
+        """Test that analyze extracts dependencies and their usage with one walk"""
+        (python_repo_with_imports / "requirements.txt").write_text("requests==2.25.0\ndjango==3.2.0\n")
+        (python_repo_with_imports / "index.js").write_text("import express from 'express';\n")
+
+        with patch("app.services.dependency_service.os.scandir", wraps=os.scandir) as mock_scandir:
+            dependencies, usage = await service.analyze(python_repo_with_imports)
+
+        assert mock_scandir.call_count == 1
+        assert [dep.name for dep in dependencies] == ["requests", "django"]
+        assert usage == {"requests": True, "django": False}
+
+    def test_scan_usage_stops_when_all_found(self, service, tmp_path):
+        """Test that the scan stops reading files once every dependency was found"""
+        for i in range(5):
+            (tmp_path / f"module{i}.py").write_text("import requests\n")
+
+        dependencies = [Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON)]
+
+        with patch("app.services.dependency_service._record_usage", wraps=_record_usage) as mock_record:
+            assert service.scan_usage(dependencies, tmp_path) == {"requests": True}
+
+        assert mock_record.call_count == 1
+
+    def test_scan_usage_process_pool(self, service, tmp_path):
+        """Test that scanning many files across processes finds the same dependencies"""
+        for i in range(100):
+            (tmp_path / f"module{i}.py").write_text("import os\n")
+        (tmp_path / "module42.py").write_text("from flask import Flask\n")
+        (tmp_path / "module99.py").write_text("import requests\n")
+
+        dependencies = [
+            Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON),
+            Dependency(name="flask", version="2.0.1", dependency_type=DependencyType.PYTHON),
+            Dependency(name="django", version="3.2.0", dependency_type=DependencyType.PYTHON),
+        ]
+
+        with patch("app.services.dependency_service.PARALLEL_SCAN_MIN_FILES", 10), \
+                patch("app.services.dependency_service.PARALLEL_SCAN_CHUNK_SIZE", 16):
+            usage = service.scan_usage(dependencies, tmp_path)
+
+        assert usage == {"requests": True, "flask": True, "django": False}
+
+    def test_scan_usage_shared_process_pool(self, tmp_path):
+        """Test that a shared process pool serves several scans and is left running"""
+        for i in range(40):
+            (tmp_path / f"module{i}.py").write_text("import os\n")
+        (tmp_path / "module7.py").write_text("import requests\n")
+
+        requests = [Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON)]
+        flask = [Dependency(name="flask", version="2.0.1", dependency_type=DependencyType.PYTHON)]
+
+        with create_scan_executor() as pool:
+            service = DependencyService(scan_executor=pool)
+            with patch("app.services.dependency_service.PARALLEL_SCAN_MIN_FILES", 10), \
+                    patch("app.services.dependency_service.PARALLEL_SCAN_CHUNK_SIZE", 16):
+                assert service.scan_usage(requests, tmp_path) == {"requests": True}
+                assert service.scan_usage(flask, tmp_path) == {"flask": False}
+
     def test_max_dependencies_limit(self, service):
         """Test that max_dependencies limit is respected"""
         # Create many dependencies
@@ -234,3 +471,15 @@ import numpy as np
         service.max_dependencies = 100
         limited_deps = dependencies[:service.max_dependencies]
         assert len(limited_deps) == 100
+
+    @pytest.mark.asyncio
+    async def test_max_dependencies_stops_parsing(self, tmp_path):
+        """Test that dependencies past the limit are never built"""
+        service = DependencyService(max_dependencies=10)
+        (tmp_path / "requirements.txt").write_text("".join(f"package-{i}==1.0.0\n" for i in range(150)))
+
+        with patch("app.services.dependency_service.Dependency", wraps=Dependency) as mock_dependency:
+            dependencies = await service.extract_dependencies(tmp_path)
+
+        assert [d.name for d in dependencies] == [f"package-{i}" for i in range(10)]
+        assert mock_dependency.call_count == 10
@@ -0,0 +1,60 @@
+import pytest
+from datetime import datetime
+
+from app.services.report_service import ReportService
+from app.models.analysis import AnalysisResponse
+from app.models.dependency import Dependency, DependencyType
+
+
+class TestReportService:
+    """Test cases for ReportService"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = ReportService(db_path=str(tmp_path / "reports.db"))
+        yield service
+        service.close()
+
+    @pytest.fixture(scope="module")
+    def sample_report(self):
+        return AnalysisResponse(
+            report_id="report-1",
+            repo_url="https://github.com/testuser/testrepo",
+            analysis_timestamp=datetime(2024, 1, 1, 12, 0, 0),
+            dependencies_analyzed=1,
+            vulnerabilities_found=2,
+            real_threats=1,
+            dependencies=[
+                Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON)
+            ],
+            analysis_duration=1.5
+        )
+
+    def test_save_and_get(self, service, sample_report):
+        """Test that a stored report round-trips unchanged"""
+        service.save(sample_report)
+
+        assert service.get("report-1") == sample_report
+        assert service.get("missing") is None
+
+    def test_list_summaries(self, service, sample_report):
+        """Test listing report summaries"""
+        service.save(sample_report)
+
+        assert service.list_summaries() == [
+            {
+                "report_id": "report-1",
+                "repo_url": "https://github.com/testuser/testrepo",
+                "analysis_timestamp": "2024-01-01T12:00:00",
+                "vulnerabilities_found": 2,
+                "real_threats": 1
+            }
+        ]
+
+    def test_delete(self, service, sample_report):
+        """Test deleting reports"""
+        service.save(sample_report)
+
+        assert service.delete("report-1") is True
+        assert service.delete("report-1") is False
+        assert service.get("report-1") is None
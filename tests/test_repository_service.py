@@ -0,0 +1,45 @@
+import asyncio
+import os
+import pytest
+
+from app.services.repository_service import RepositoryService
+
+
+class TestRepositoryService:
+    """Test cases for RepositoryService"""
+
+    @pytest.fixture
+    def service(self, tmp_path):
+        service = RepositoryService(clone_timeout=0.1, clone_dir=str(tmp_path))
+
+        async def slow_git(*args):
+            await asyncio.sleep(5)
+
+        service._run_git = slow_git
+        return service
+
+    @pytest.mark.asyncio
+    async def test_clone_timeout_removes_directory(self, service, tmp_path):
+        """Test that a clone over the timeout raises TimeoutError and leaves no directory behind"""
+        with pytest.raises(TimeoutError, match="timed out"):
+            await service.clone_repository("https://github.com/testuser/testrepo")
+
+        assert os.listdir(tmp_path) == []
+        assert service.temp_dir is None
+
+    @pytest.mark.asyncio
+    async def test_cancelled_clone_removes_directory(self, service, tmp_path):
+        """Test that cancelling an analysis mid-clone leaves no directory behind"""
+        task = asyncio.create_task(service.clone_repository("https://github.com/testuser/testrepo"))
+        await asyncio.sleep(0.01)
+        task.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert os.listdir(tmp_path) == []
+
+    @pytest.mark.asyncio
+    async def test_list_files_timeout(self, service, tmp_path):
+        """Test that listing files is bounded by the clone timeout"""
+        with pytest.raises(RuntimeError, match="timed out"):
+            await service.list_files(tmp_path)
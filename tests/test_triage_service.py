@@ -0,0 +1,208 @@
+import pytest
+import orjson
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.services.cache_service import CacheService
+from app.services.triage_service import (
+    GROUP_SYSTEM_PROMPT,
+    GROUP_TRIAGE_RESPONSE_FORMAT,
+    SYSTEM_PROMPT,
+    TRIAGE_RESPONSE_FORMAT,
+    TriageService
+)
+from app.models.dependency import Dependency, DependencyType
+from app.models.vulnerability import Vulnerability, ThreatLevel
+
+
+class TestTriageService:
+    """Test cases for TriageService"""
+
+    @pytest.fixture
+    def service(self):
+        return TriageService(openai_api_key="test-key")
+
+    @pytest.fixture(scope="module")
+    def sample_dependency(self):
+        return Dependency(
+            name="requests",
+            version="2.25.0",
+            dependency_type=DependencyType.PYTHON,
+            is_direct=True
+        )
+
+    @pytest.fixture(scope="module")
+    def sample_vulnerabilities(self):
+        return [
+            Vulnerability(id=f"CVE-{i}", summary=f"Vulnerability {i}", severity="HIGH")
+            for i in range(1, 4)
+        ]
+
+    def test_client_retries(self):
+        """Test that rate limited requests are retried by the client"""
+        assert TriageService(openai_api_key="test-key", max_retries=3).client.max_retries == 3
+
+    def test_rejects_models_without_structured_outputs(self):
+        """Test that the model requests are sent to must support the json_schema format"""
+        with pytest.raises(ValueError, match="structured outputs"):
+            TriageService(openai_api_key="test-key", model="gpt-3.5-turbo")
+
+    @pytest.mark.asyncio
+    async def test_triage_batch(self, service, sample_dependency, sample_vulnerabilities):
+        """Test that a group is triaged with one request and unmatched items fall back"""
+        items = [(vuln, sample_dependency, True) for vuln in sample_vulnerabilities]
+        response_text = """
+        {"results": [
+            {"index": 2, "is_real_threat": false, "threat_level": "low", "impact_summary": "None",
+             "recommendation": "Monitor", "confidence": 0.9, "reasoning": "Not reachable"},
+            {"index": 1, "is_real_threat": true, "threat_level": "critical", "impact_summary": "RCE",
+             "recommendation": "Upgrade", "confidence": 0.8, "reasoning": "Reachable"}
+        ]}
+        """
+
+        with patch.object(service, '_complete', new_callable=AsyncMock) as mock_complete:
+            mock_complete.return_value = response_text
+
+            results = await service.triage_batch(items, "Repository context")
+
+        mock_complete.assert_called_once()
+        system_prompt, user_content, response_format, _ = mock_complete.call_args[0]
+        assert system_prompt == GROUP_SYSTEM_PROMPT
+        assert response_format == GROUP_TRIAGE_RESPONSE_FORMAT
+        assert user_content["repo_context"] == "Repository context"
+        assert [(v["index"], v["vulnerability"]["id"]) for v in user_content["vulnerabilities"]] == [
+            (1, "CVE-1"), (2, "CVE-2"), (3, "CVE-3")
+        ]
+
+        assert results[0].threat_level == ThreatLevel.CRITICAL
+        assert results[1].is_real_threat is False
+        assert results[2].reasoning == "Fallback analysis used due to LLM processing error"
+
+    @pytest.mark.asyncio
+    async def test_triage_batch_invalid_response(self, service, sample_dependency, sample_vulnerabilities):
+        """Test that an unparseable response falls back for every item"""
+        items = [(vuln, sample_dependency, False) for vuln in sample_vulnerabilities[:2]]
+
+        with patch.object(service, '_complete', new_callable=AsyncMock) as mock_complete:
+            mock_complete.return_value = "not json"
+
+            results = await service.triage_batch(items, "Repository context")
+
+        assert len(results) == 2
+        assert all(result.confidence == 0.5 for result in results)
+
+    @pytest.mark.asyncio
+    async def test_triage_batch_single(self, service, sample_dependency, sample_vulnerabilities):
+        """Test that a group of one uses the single vulnerability prompt"""
+        items = [(sample_vulnerabilities[0], sample_dependency, True)]
+
+        with patch.object(service, 'triage_vulnerability', new_callable=AsyncMock) as mock_triage:
+            mock_triage.return_value = MagicMock()
+
+            results = await service.triage_batch(items, "Repository context")
+
+            mock_triage.assert_called_once_with(sample_vulnerabilities[0], sample_dependency, "Repository context", True)
+            assert results == [mock_triage.return_value]
+
+    @pytest.mark.asyncio
+    async def test_triage_vulnerability_structured_output(self, service, sample_dependency, sample_vulnerabilities):
+        """Test that a single triage requests a schema-constrained response and validates it"""
+        message = MagicMock(
+            content='{"is_real_threat": true, "threat_level": "high", "impact_summary": "RCE", '
+                    '"recommendation": "Upgrade", "confidence": 0.8, "reasoning": "Reachable"}'
+        )
+        create = AsyncMock(return_value=MagicMock(choices=[MagicMock(message=message)]))
+
+        with patch.object(service.client.chat.completions, 'create', create):
+            result = await service.triage_vulnerability(sample_vulnerabilities[0], sample_dependency, "context", True)
+
+        assert create.call_args.kwargs["response_format"] == TRIAGE_RESPONSE_FORMAT
+        system_message, user_message = create.call_args.kwargs["messages"]
+        assert system_message == {"role": "system", "content": SYSTEM_PROMPT}
+        assert orjson.loads(user_message["content"])["dependency"]["type"] == "python"
+        assert result.threat_level == ThreatLevel.HIGH
+        assert result.is_real_threat is True
+
+    @pytest.mark.asyncio
+    async def test_triage_vulnerability_refusal(self, service, sample_dependency, sample_vulnerabilities):
+        """Test that a refused structured output falls back instead of raising"""
+        message = MagicMock(content=None, refusal="I can't help with that")
+        create = AsyncMock(return_value=MagicMock(choices=[MagicMock(message=message)]))
+
+        with patch.object(service.client.chat.completions, 'create', create):
+            result = await service.triage_vulnerability(sample_vulnerabilities[0], sample_dependency, "context", True)
+
+        assert result.reasoning == "Fallback analysis used due to LLM processing error"
+
+    @pytest.mark.asyncio
+    async def test_triage_vulnerabilities_batch(self, service, sample_dependency, sample_vulnerabilities):
+        """Test that vulnerabilities are triaged concurrently and failures fall back"""
+        vulnerabilities = [
+            vuln.model_copy(update={"affected_packages": [{"name": "requests", "ecosystem": "PyPI"}]})
+            for vuln in sample_vulnerabilities
+        ]
+
+        async def triage(vuln, dep, context, is_used):
+            if vuln.id == "CVE-2":
+                raise Exception("LLM unavailable")
+            return service._fallback_triage(vuln, dep, is_used).model_copy(update={"confidence": 0.9})
+
+        with patch.object(service, 'triage_vulnerability', side_effect=triage):
+            results = await service.triage_vulnerabilities_batch(
+                vulnerabilities, [sample_dependency], "context", {"requests": True}
+            )
+
+        assert [result.confidence for result in results] == [0.9, 0.5, 0.9]
+
+    @pytest.mark.asyncio
+    async def test_triage_results_cached(self, sample_dependency, sample_vulnerabilities, tmp_path):
+        """Test that LLM verdicts are reused for identical inputs, and fallbacks are not cached"""
+        service = TriageService(openai_api_key="test-key", cache=CacheService(str(tmp_path / "cache.db")))
+        items = [(vuln, sample_dependency, True) for vuln in sample_vulnerabilities]
+        response_text = """
+        {"results": [
+            {"index": 1, "is_real_threat": true, "threat_level": "high", "impact_summary": "RCE",
+             "recommendation": "Upgrade", "confidence": 0.8, "reasoning": "Reachable"},
+            {"index": 2, "is_real_threat": false, "threat_level": "low", "impact_summary": "None",
+             "recommendation": "Monitor", "confidence": 0.9, "reasoning": "Not reachable"}
+        ]}
+        """
+
+        with patch.object(service, '_complete', new_callable=AsyncMock) as mock_complete:
+            mock_complete.return_value = response_text
+            first = await service.triage_batch(items, "Repository context")
+
+            # Only the third verdict was a fallback, so only it is sent again
+            second = await service.triage_batch(items, "Repository context")
+
+            assert mock_complete.call_count == 2
+            assert mock_complete.call_args[0][1]["vulnerability"]["id"] == "CVE-3"
+            assert second[:2] == first[:2]
+
+            # A different repository context is a different question
+            await service.triage_batch(items[:1], "Other context")
+            assert mock_complete.call_count == 3
+
+        service.cache.close()
+
+    @pytest.mark.asyncio
+    async def test_triage_results_cached_in_memory(self, sample_dependency, sample_vulnerabilities):
+        """Test that verdicts are reused without a persistent cache, least recently used first out"""
+        service = TriageService(openai_api_key="test-key", memory_cache_size=2)
+        response_text = """
+        {"is_real_threat": true, "threat_level": "high", "impact_summary": "RCE",
+         "recommendation": "Upgrade", "confidence": 0.8, "reasoning": "Reachable"}
+        """
+
+        with patch.object(service, '_complete', new_callable=AsyncMock) as mock_complete:
+            mock_complete.return_value = response_text
+            for vuln in sample_vulnerabilities[:2]:
+                await service.triage_vulnerability(vuln, sample_dependency, "context", True)
+            await service.triage_vulnerability(sample_vulnerabilities[0], sample_dependency, "context", True)
+            assert mock_complete.call_count == 2
+
+            # The third verdict evicts CVE-2, the least recently used
+            await service.triage_vulnerability(sample_vulnerabilities[2], sample_dependency, "context", True)
+            await service.triage_vulnerability(sample_vulnerabilities[0], sample_dependency, "context", True)
+            assert mock_complete.call_count == 3
+            await service.triage_vulnerability(sample_vulnerabilities[1], sample_dependency, "context", True)
+            assert mock_complete.call_count == 4
@@ -4,6 +4,7 @@ from unittest.mock import AsyncMock, patch, MagicMock
 from datetime import datetime
 
 from app.services.vulnerability_service import VulnerabilityService
+from app.services.cache_service import CacheService
 from app.models.dependency import Dependency, DependencyType
 from app.models.vulnerability import Vulnerability
 
@@ -15,7 +16,7 @@ class TestVulnerabilityService:
     def service(self):
         return VulnerabilityService(osv_api_url="https://api.osv.dev")
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_dependency(self):
         return Dependency(
             name="requests",
@@ -24,7 +25,7 @@ class TestVulnerabilityService:
             is_direct=True
         )
 
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def sample_vulnerability_data(self):
         return {
             "id": "CVE-2023-1234",
@@ -156,42 +157,154 @@ class TestVulnerabilityService:
             # Should return empty list on error
             assert vulnerabilities == []
 
+    def test_build_query_version(self, service):
+        """Test that only exact versions are sent to OSV"""
+        def query(name, version, dependency_type, **metadata):
+            return service._build_query(
+                Dependency(name=name, version=version, dependency_type=dependency_type, metadata=metadata)
+            )
+
+        assert query("lodash", "4.17.21", DependencyType.NPM)["version"] == "4.17.21"
+        assert "version" not in query("express", "^4.17.1", DependencyType.NPM)
+        assert query("requests", "2.25.0", DependencyType.PYTHON, pinned=True)["version"] == "2.25.0"
+        assert "version" not in query("requests", "2.25.0", DependencyType.PYTHON, pinned=False)
+        assert "version" not in query("flask", "2.0,<3.0", DependencyType.PYTHON)
+        assert query("django", "3.2.0", DependencyType.PYTHON)["package"] == {"name": "django", "ecosystem": "PyPI"}
+
     @pytest.mark.asyncio
     async def test_get_vulnerabilities_batch(self, service):
         """Test batch vulnerability query"""
         dependencies = [
             Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON, is_direct=True),
-            Dependency(name="express", version="4.17.1", dependency_type=DependencyType.NPM, is_direct=True)
+            Dependency(name="express", version="4.17.1", dependency_type=DependencyType.NPM, is_direct=True),
+            Dependency(name="lodash", version="4.17.21", dependency_type=DependencyType.NPM, is_direct=True)
         ]
 
         # Set up a mock session
         service.session = MagicMock()
 
-        # Mock responses for each dependency
-        mock_responses = {
-            "requests": {"vulns": [{"id": "CVE-1", "summary": "Vuln 1"}]},
-            "express": {"vulns": [{"id": "CVE-2", "summary": "Vuln 2"}]}
+        batch_response = {
+            "results": [
+                {"vulns": [{"id": "CVE-1", "modified": "2023-01-01T00:00:00Z"}]},
+                {"vulns": [{"id": "CVE-2", "modified": "2023-01-01T00:00:00Z"},
+                           {"id": "CVE-1", "modified": "2023-01-01T00:00:00Z"}]},
+                {}
+            ]
+        }
+        records = {
+            "CVE-1": {"id": "CVE-1", "summary": "Vuln 1"},
+            "CVE-2": {"id": "CVE-2", "summary": "Vuln 2"}
         }
 
-        # Mock the entire method to avoid complex async context manager mocking
-        with patch.object(service, '_make_api_request') as mock_request:
-            def mock_request_side_effect(query):
-                # Determine which dependency this request is for
-                if "requests" in str(query):
-                    return mock_responses["requests"]
-                else:
-                    return mock_responses["express"]
+        with patch.object(service, '_make_batch_request') as mock_batch, \
+             patch.object(service, '_fetch_vulnerability_data') as mock_fetch:
+            mock_batch.return_value = batch_response
+            mock_fetch.side_effect = lambda vuln_id: records[vuln_id]
+
+            results = await service.get_vulnerabilities_batch(dependencies)
+
+            # One batch query for all dependencies, one fetch per unique ID
+            mock_batch.assert_called_once()
+            assert len(mock_batch.call_args[0][0]) == 3
+            assert mock_fetch.call_count == 2
+
+            requests, express, lodash = (dep.version_key for dep in dependencies)
+            assert [v.id for v in results[requests]] == ["CVE-1"]
+            assert [v.id for v in results[express]] == ["CVE-2", "CVE-1"]
+            assert results[lodash] == []
+
+    @pytest.mark.asyncio
+    async def test_get_vulnerabilities_batch_chunked(self):
+        """Test that large batches are split into chunks and a failed chunk only affects itself"""
+        service = VulnerabilityService(batch_size=2)
+        service.session = MagicMock()
+        dependencies = [
+            Dependency(name=f"pkg{i}", version="1.0.0", dependency_type=DependencyType.PYTHON, is_direct=True)
+            for i in range(3)
+        ]
+
+        async def batch_request(queries):
+            if queries[0]["package"]["name"] == "pkg2":
+                raise Exception("API Error")
+            return {"results": [{"vulns": [{"id": "CVE-1"}]}, {}]}
+
+        with patch.object(service, '_make_batch_request', side_effect=batch_request) as mock_batch, \
+             patch.object(service, '_fetch_vulnerability_data') as mock_fetch:
+            mock_fetch.return_value = {"id": "CVE-1", "summary": "Vuln 1"}
+
+            results = await service.get_vulnerabilities_batch(dependencies)
+
+            assert mock_batch.call_count == 2
+            assert [[v.id for v in results[dep.version_key]] for dep in dependencies] == [["CVE-1"], [], []]
+
+    @pytest.mark.asyncio
+    async def test_get_vulnerabilities_batch_keeps_same_names_apart(self, service):
+        """Test that packages sharing a name across ecosystems or versions get their own results"""
+        dependencies = [
+            Dependency(name="debug", version="2.6.8", dependency_type=DependencyType.NPM, is_direct=True),
+            Dependency(name="debug", version="4.3.4", dependency_type=DependencyType.NPM, is_direct=False),
+            Dependency(name="debug", version="2.6.8", dependency_type=DependencyType.PYTHON, is_direct=True)
+        ]
+        service.session = MagicMock()
 
-            mock_request.side_effect = mock_request_side_effect
+        batch_response = {"results": [{"vulns": [{"id": "CVE-1"}]}, {}, {"vulns": [{"id": "PYSEC-1"}]}]}
+        records = {"CVE-1": {"id": "CVE-1", "summary": "Vuln 1"}, "PYSEC-1": {"id": "PYSEC-1", "summary": "Vuln 2"}}
 
+        with patch.object(service, '_make_batch_request', return_value=batch_response), \
+             patch.object(service, '_fetch_vulnerability_data', side_effect=lambda vuln_id: records[vuln_id]):
             results = await service.get_vulnerabilities_batch(dependencies)
 
-            assert "requests" in results
-            assert "express" in results
-            assert len(results["requests"]) == 1
-            assert len(results["express"]) == 1
-            assert results["requests"][0].id == "CVE-1"
-            assert results["express"][0].id == "CVE-2"
+        assert [[v.id for v in results[dep.version_key]] for dep in dependencies] == [["CVE-1"], [], ["PYSEC-1"]]
+
+    @pytest.mark.asyncio
+    async def test_get_vulnerabilities_batch_error(self, service):
+        """Test batch vulnerability query with API error"""
+        dependencies = [
+            Dependency(name="requests", version="2.25.0", dependency_type=DependencyType.PYTHON, is_direct=True)
+        ]
+        service.session = MagicMock()
+
+        with patch.object(service, '_make_batch_request') as mock_batch:
+            mock_batch.side_effect = Exception("API Error")
+
+            results = await service.get_vulnerabilities_batch(dependencies)
+
+            assert results == {dependencies[0].version_key: []}
+
+    @pytest.mark.asyncio
+    async def test_get_vulnerabilities_batch_cached(self, sample_dependency, tmp_path):
+        """Test that cached query results and records are reused until OSV reports a newer record"""
+        service = VulnerabilityService(cache=CacheService(str(tmp_path / "cache.db")))
+        service.session = MagicMock()
+
+        batch_response = {"results": [{"vulns": [{"id": "CVE-1", "modified": "2023-01-01T00:00:00Z"}]}]}
+        record = {"id": "CVE-1", "summary": "Vuln 1", "modified": "2023-01-01T00:00:00Z"}
+
+        with patch.object(service, '_make_batch_request') as mock_batch, \
+             patch.object(service, '_fetch_vulnerability_data') as mock_fetch:
+            mock_batch.return_value = batch_response
+            mock_fetch.return_value = record
+
+            first = await service.get_vulnerabilities_batch([sample_dependency])
+            second = await service.get_vulnerabilities_batch([sample_dependency])
+
+            assert mock_batch.call_count == 1
+            assert mock_fetch.call_count == 1
+            assert [v.id for v in first[sample_dependency.version_key]] == ["CVE-1"]
+            assert second == first
+
+            # A newer modification time for the same ID invalidates the cached record
+            service.cache.set(
+                service._query_cache_key(sample_dependency),
+                '[{"id": "CVE-1", "modified": "2023-06-01T00:00:00Z"}]',
+                expire=60
+            )
+            await service.get_vulnerabilities_batch([sample_dependency])
+
+            assert mock_batch.call_count == 1
+            assert mock_fetch.call_count == 2
+
+        service.cache.close()
 
     @pytest.mark.asyncio
     async def test_context_manager(self, service):
@@ -207,3 +320,14 @@ class TestVulnerabilityService:
 
             # Session should be closed
             mock_session.close.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_context_manager_shared_session(self):
+        """Test that a shared session is used as-is and left open"""
+        shared_session = MagicMock()
+        shared_session.close = AsyncMock()
+
+        async with VulnerabilityService(session=shared_session) as svc:
+            assert svc.session is shared_session
+
+        shared_session.close.assert_not_called()